@@ -20,7 +20,6 @@ This tool allows for easy graphical access to common ATFA commands.  It also
 locates Fastboot devices and can initiate communication between the ATFA and
 an Android Things device.
 """
-import copy
 import datetime
 import json
 import math
@@ -1439,6 +1438,28 @@ class Atft(wx.Frame):
   # slot.
   MULTIPLE_DEVICE_MODE = 1
 
+  # The default steps included in the auto provisioning process.
+  DEFAULT_PROVISION_STEPS_PRODUCT = [
+      'FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct']
+
+  DEFAULT_PROVISION_STEPS_SOM = ['FuseVbootKey', 'ProvisionSom']
+
+  # The available provision steps.
+  AVAILABLE_PROVISION_STEPS = [
+      'FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct',
+      'UnlockAvb', 'ProvisionSom']
+
+  # The provision state attribute each provision step sets and its value after
+  # the step.
+  PROVISION_STEP_EFFECTS = {
+      'FuseVbootKey': ('bootloader_locked', True),
+      'FusePermAttr': ('avb_perm_attr_set', True),
+      'LockAvb': ('avb_locked', True),
+      'UnlockAvb': ('avb_locked', False),
+      'ProvisionProduct': ('product_provisioned', True),
+      'ProvisionSom': ('som_provisioned', True),
+  }
+
   def __init__(self):
     # If this is set to True, no prerequisites would be checked against manual
     # operation, such as you can do key provisioning before fusing the vboot key.
@@ -1446,17 +1467,6 @@ class Atft(wx.Frame):
 
     self.provision_steps = []
 
-    # The default steps included in the auto provisioning process.
-    self.DEFAULT_PROVISION_STEPS_PRODUCT = [
-        'FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct']
-
-    self.DEFAULT_PROVISION_STEPS_SOM = ['FuseVbootKey', 'ProvisionSom']
-
-    # The available provision steps.
-    self.AVAILABLE_PROVISION_STEPS = [
-        'FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct',
-        'UnlockAvb', 'ProvisionSom']
-
     self.configs = self.ParseConfigFile()
 
     self.SetLanguage()
@@ -3191,26 +3201,17 @@ class Atft(wx.Frame):
       success if the target device has already gone through the provision steps
       successfully.
     """
-    final_state = copy.deepcopy(provision_state)
+    # Only the attributes the steps change need to be checked, and the last
+    # step changing an attribute decides its final value.
+    final_values = {}
     for operation in self.provision_steps:
-      if operation == 'FuseVbootKey':
-        final_state.bootloader_locked = True
-        continue
-      elif operation == 'FusePermAttr':
-        final_state.avb_perm_attr_set = True
-        continue
-      elif operation == 'LockAvb':
-        final_state.avb_locked = True
-        continue
-      elif operation == 'UnlockAvb':
-        final_state.avb_locked = False
-        continue
-      elif operation == 'ProvisionProduct':
-        final_state.product_provisioned = True
-        continue
-      elif operation == 'ProvisionSom':
-        final_state.som_provisioned = True
-    return (provision_state == final_state);
+      if operation in self.PROVISION_STEP_EFFECTS:
+        attr, value = self.PROVISION_STEP_EFFECTS[operation]
+        final_values[attr] = value
+    for attr, value in final_values.iteritems():
+      if getattr(provision_state, attr) != value:
+        return False
+    return True
 
   def _HandleAutoProv(self):
     """Do the state transition for devices if in auto provisioning mode.
@@ -13,21 +13,25 @@
 # limitations under the License.
 
 """Unit test for atft."""
-import types
+import copy
+import itertools
 import unittest
 
 import atft
+from atftman import AtftManager
 from atftman import ProvisionStatus
 from atftman import ProvisionState
 import fastboot_exceptions
 from pyfakefs.fake_filesystem_unittest import TestCase
 from mock import call
+from mock import DEFAULT
 from mock import MagicMock
+from mock import Mock
 from mock import patch
-from mock import mock_open
 import os
 import sets
 import shutil
+import threading
 import wx
 
 
@@ -44,29 +48,104 @@ COLOR_LIGHT_GREY_TEXT = wx.Colour(214, 214, 214)
 COLOR_BLACK = wx.Colour(0, 0, 0)
 COLOR_PICK_BLUE = wx.Colour(149, 169, 235)
 
+# The provision state attribute each successful operation sets, used by
+# AtftTest.MockStateChange.
+STATE_CHANGE_EFFECTS = {
+    ProvisionStatus.REBOOT_SUCCESS: ('bootloader_locked', True),
+    ProvisionStatus.FUSEATTR_SUCCESS: ('avb_perm_attr_set', True),
+    ProvisionStatus.LOCKAVB_SUCCESS: ('avb_locked', True),
+    ProvisionStatus.PROVISION_SUCCESS: ('product_provisioned', True),
+    ProvisionStatus.UNLOCKAVB_SUCCESS: ('avb_locked', False),
+}
+
+# The provision status for the furthest provision state reached, in order.
+STATE_CHANGE_STATUS = (
+    ('product_provisioned', ProvisionStatus.PROVISION_SUCCESS),
+    ('avb_locked', ProvisionStatus.LOCKAVB_SUCCESS),
+    ('avb_perm_attr_set', ProvisionStatus.FUSEATTR_SUCCESS),
+    ('bootloader_locked', ProvisionStatus.FUSEVBOOT_SUCCESS),
+)
+
+# A fastboot failure with no message, shared by the tests that only need some
+# FastbootFailure to be raised.
+FASTBOOT_FAILURE = fastboot_exceptions.FastbootFailure('')
+
+# A placeholder for the constructor arguments the code under test never uses.
+IGNORED = Mock()
+
+# The real wx.FileDialog, used as the spec of the dialog mocks in the tests that
+# patch wx.FileDialog.
+REAL_FILE_DIALOG = wx.FileDialog
+
+
+def NoOp(*args, **kwargs):
+  pass
+
 
 class MockAtft(atft.Atft):
+  """Atft with only the state the tests use.
+
+  It still subclasses atft.Atft so that the methods under test and the methods
+  they call on self resolve to the real implementation. atft.Atft.__init__ is
+  not called since it initializes the UI, the log, the audit and the key
+  handler, and starts refreshing devices, none of which the tests need.
+  """
+  # The number of UI slots _PrintTargetDevices fills.
+  TARGET_DEV_SIZE = atft.TARGET_DEV_SIZE
 
   def __init__(self):
-    self.InitializeUI = MagicMock()
-    self.StartRefreshingDevices = MagicMock()
-    self.ChooseProduct = MagicMock()
-    self.CreateAtftManager = MagicMock()
-    self.CreateAtftLog = MagicMock()
-    self.CreateAtftAudit = MagicMock()
-    self.CreateAtftKeyHandler = MagicMock()
-    self.CreateShortCuts = MagicMock()
-    self.ParseConfigFile = self._MockParseConfig
-    self._SendPrintEvent = MagicMock()
-    self._OnToggleSupMode = MagicMock()
-    self.ShowStartScreen = MagicMock()
-    self._CreateThread = self._MockCreateThread
-    self.TARGET_DEV_SIZE = 6
-    self.atft_string = MagicMock()
-    self.target_devs_components = MagicMock()
-    atft.Atft.__init__(self)
+    # A real event type, the events queued with it go to the wx.QueueEvent
+    # mock.
+    self.dev_listed_event = wx.NewEventType()
+    self._InitState()
+    self.SetLanguage()
+
+  def Copy(self):
+    """Create a MockAtft sharing the constants of this one.
+
+    The copy gets its own atft_string, shallow copied instead of built again,
+    and its own state from _InitState.
+
+    Returns:
+      The new MockAtft object.
+    """
+    mock_atft = copy.copy(self)
+    mock_atft.atft_string = copy.copy(self.atft_string)
+    mock_atft._InitState()
+    return mock_atft
+
+  def _InitState(self):
+    """Initialize the attributes that tests change, mocks included."""
+    self.test_mode = False
     self.provision_steps = self.DEFAULT_PROVISION_STEPS_PRODUCT
     self.skip_reboot = False
+    self.configs = self._MockParseConfig()
+    # Specced on the class, so the instance attributes AtftManager.__init__
+    # sets are set here. A product and a som are selected.
+    self.atft_manager = MagicMock(spec=AtftManager)
+    self.atft_manager.target_devs = []
+    self.atft_manager.product_info = MagicMock()
+    self.atft_manager.som_info = MagicMock()
+    self.refresh_timer = None
+    self.auto_dev_serials = []
+    self.last_target_list = []
+    self.ignored_unmapped_device_serials = sets.Set()
+    self.auto_prov = False
+    self.refresh_pause_lock = threading.Semaphore(0)
+    self.listing_device_lock = threading.Lock()
+    self.first_key_alert_shown = False
+    self.second_key_alert_shown = False
+    self.checking_mapping_mode_lock = threading.Lock()
+    self.auto_prov_lock = threading.Lock()
+    self.alert_lock = threading.Lock()
+    self.sup_mode = True
+    self.start_screen_shown = False
+    self.target_devs_components = MagicMock()
+    self.log = Mock()
+    self.audit = Mock()
+    self.key_handler = Mock()
+    self._SendPrintEvent = NoOp
+    self._CreateThread = self._MockCreateThread
 
   def _MockParseConfig(self):
     self.atft_version = 'vTest'
@@ -89,6 +168,9 @@ class MockAtft(atft.Atft):
 
 
 class TestDeviceInfo(object):
+  __slots__ = ('serial_number', 'location', 'provision_status',
+               'provision_state', 'time_set', 'operation_lock', 'operation',
+               'at_attest_uuid')
 
   def __init__(self, serial_number, location=None, provision_status=None):
     self.serial_number = serial_number
@@ -96,7 +178,7 @@ class TestDeviceInfo(object):
     self.provision_status = provision_status
     self.provision_state = ProvisionState()
     self.time_set = False
-    self.operation_lock = MagicMock()
+    self.operation_lock = Mock()
     self.operation = None
     self.at_attest_uuid = None
 
@@ -107,11 +189,35 @@ class TestDeviceInfo(object):
   def __ne__(self, other):
     return not self.__eq__(other)
 
+  def __hash__(self):
+    return hash((self.serial_number, self.location))
+
   def Copy(self):
     return TestDeviceInfo(self.serial_number, self.location,
                           self.provision_status)
 
 
+class FakeAtftManager(object):
+  """Fake atftman.AtftManager for the device operation tests.
+
+  Only the members used by the operations under test are defined, so using any
+  other member fails instead of silently creating a child mock.
+  """
+
+  def __init__(self):
+    self.product_info = Mock()
+    self.som_info = None
+    self.GetATFADevice = Mock()
+    self.GetTargetDevice = Mock()
+    self.GetCachedATFAKeysLeft = Mock()
+    self.UpdateATFAKeysLeft = Mock()
+    self.Reboot = Mock()
+    self.FuseVbootKey = Mock()
+    self.FusePermAttr = Mock()
+    self.LockAvb = Mock()
+    self.Provision = Mock()
+
+
 class AtftTest(TestCase):
   TEST_SERIAL1 = 'test-serial1'
   TEST_LOCATION1 = 'test-location1'
@@ -133,36 +239,191 @@ class AtftTest(TestCase):
   TEST_ATTEST_UUID = 'test attest uuid'
   TEST_ATFA_ID1 ="ATFATEST1"
   TEST_ATFA_ID2 = "ATFATEST2"
+  # The methods that SilenceEvents replaces with no-ops.
+  SILENCED_METHODS = (
+      'PauseRefresh', 'ResumeRefresh', '_SendStartMessageEvent',
+      '_SendSucceedMessageEvent', '_SendAlertEvent', '_SendMessageEvent',
+      '_SendLowKeyAlertEvent')
+  # The mock attributes of a MockAtft, reset on shared_atft before each test.
+  SHARED_ATFT_MOCKS = (
+      'atft_manager', 'target_devs_components', 'log', 'audit', 'key_handler')
+  # The methods of the MockAtft for the ATFA operation tests that are replaced
+  # with mocks, see _CreateAtfaOperationAtft. Only the methods the tests check
+  # are listed, _SendAlertEvent is replaced with NoOp instead.
+  ATFA_OPERATION_MOCKS = (
+      '_UpdateKeysLeftInATFA', '_SendOperationStartEvent',
+      '_SendOperationSucceedEvent', 'PauseRefresh', 'ResumeRefresh',
+      '_HandleException')
+  # The (exception, whether the ATFA device download or upload fails instead
+  # of the operation) cases for the ATFA operation failure tests.
+  ATFA_FAILURE_CASES = (
+      (FASTBOOT_FAILURE, False),
+      (fastboot_exceptions.DeviceNotFoundException, False),
+      (FASTBOOT_FAILURE, True),
+      (fastboot_exceptions.DeviceNotFoundException, True))
+  # No device mapped to any of the MockAtft.TARGET_DEV_SIZE slots.
+  EMPTY_USB_LOCATIONS = (None,) * MockAtft.TARGET_DEV_SIZE
+  # Serial numbers of the devices in the device sets below. The code under
+  # test only iterates over them, so the tuples are passed directly.
+  THREE_SERIALS = (TEST_SERIAL1, TEST_SERIAL2, TEST_SERIAL3)
+  FOUR_SERIALS = THREE_SERIALS + (TEST_SERIAL4,)
+  # The provision state attributes set on a device after each step.
+  BOOTLOADER_LOCKED = ('bootloader_locked',)
+  PERM_ATTR_SET = BOOTLOADER_LOCKED + ('avb_perm_attr_set',)
+  AVB_LOCKED = PERM_ATTR_SET + ('avb_locked',)
+  # Device sets, as (serial, location, status, provision state attributes that
+  # are set), see CreateProtoDevices.
+  FUSE_VBOOT_DEVICES = (
+      (TEST_SERIAL1, TEST_LOCATION1, ProvisionStatus.IDLE, ()),
+      (TEST_SERIAL2, TEST_LOCATION2, ProvisionStatus.FUSEVBOOT_FAILED, ()),
+      (TEST_SERIAL3, TEST_LOCATION2, ProvisionStatus.FUSEVBOOT_SUCCESS,
+       BOOTLOADER_LOCKED))
+  FUSE_ATTR_DEVICES = (
+      (TEST_SERIAL1, TEST_LOCATION1, ProvisionStatus.FUSEVBOOT_SUCCESS,
+       BOOTLOADER_LOCKED),
+      (TEST_SERIAL2, TEST_LOCATION2, ProvisionStatus.REBOOT_SUCCESS,
+       BOOTLOADER_LOCKED),
+      (TEST_SERIAL3, TEST_LOCATION2, ProvisionStatus.FUSEATTR_FAILED,
+       BOOTLOADER_LOCKED),
+      (TEST_SERIAL4, TEST_LOCATION2, ProvisionStatus.FUSEATTR_SUCCESS,
+       PERM_ATTR_SET))
+  LOCK_AVB_DEVICES = (
+      (TEST_SERIAL1, TEST_LOCATION1, ProvisionStatus.FUSEATTR_SUCCESS,
+       PERM_ATTR_SET),
+      (TEST_SERIAL2, TEST_LOCATION2, ProvisionStatus.LOCKAVB_FAILED,
+       PERM_ATTR_SET),
+      (TEST_SERIAL3, TEST_LOCATION2, ProvisionStatus.FUSEATTR_FAILED,
+       BOOTLOADER_LOCKED),
+      (TEST_SERIAL4, TEST_LOCATION2, ProvisionStatus.IDLE, ()))
+  MANUAL_PROVISION_DEVICES = (
+      (TEST_SERIAL1, TEST_LOCATION1, ProvisionStatus.PROVISION_FAILED,
+       AVB_LOCKED),
+      (TEST_SERIAL2, TEST_LOCATION2, ProvisionStatus.LOCKAVB_SUCCESS,
+       AVB_LOCKED),
+      (TEST_SERIAL3, TEST_LOCATION2, ProvisionStatus.FUSEATTR_FAILED,
+       BOOTLOADER_LOCKED))
+  REPROVISION_DEVICES = (
+      (TEST_SERIAL1, TEST_LOCATION1, ProvisionStatus.PROVISION_FAILED,
+       AVB_LOCKED),
+      (TEST_SERIAL2, TEST_LOCATION2, ProvisionStatus.PROVISION_SUCCESS,
+       AVB_LOCKED + ('product_provisioned',)),
+      (TEST_SERIAL3, TEST_LOCATION2, ProvisionStatus.SOM_PROVISION_SUCCESS,
+       AVB_LOCKED + ('som_provisioned',)))
+
+  @classmethod
+  def setUpClass(cls):
+    super(AtftTest, cls).setUpClass()
+    # Device prototypes, copied for each test in setUp. The copies share the
+    # operation_lock mock, which no test inspects.
+    cls.proto_dev1 = TestDeviceInfo(
+        cls.TEST_SERIAL1, cls.TEST_LOCATION1, ProvisionStatus.IDLE)
+    cls.proto_dev2 = TestDeviceInfo(
+        cls.TEST_SERIAL2, cls.TEST_LOCATION2, ProvisionStatus.IDLE)
+    cls.fuse_vboot_protos = cls.CreateProtoDevices(cls.FUSE_VBOOT_DEVICES)
+    cls.fuse_attr_protos = cls.CreateProtoDevices(cls.FUSE_ATTR_DEVICES)
+    cls.lock_avb_protos = cls.CreateProtoDevices(cls.LOCK_AVB_DEVICES)
+    cls.manual_provision_protos = cls.CreateProtoDevices(
+        cls.MANUAL_PROVISION_DEVICES)
+    cls.reprovision_protos = cls.CreateProtoDevices(cls.REPROVISION_DEVICES)
+    # The hash of TEST_PASSWORD1. pbkdf2_sha256 is slow by design, so it is
+    # only computed once.
+    cls.password_hash1 = atft.Atft.GeneratePasswordHash(cls.TEST_PASSWORD1)
+    # The paths of the log files by number, and of the audit files by serial
+    # and number, that the AtftLog and AtftAudit tests use.
+    cls.log_files = dict(
+        (number, os.path.join(cls.LOG_DIR, 'atft_log_%d' % number))
+        for number in range(1, 4))
+    cls.audit_files = dict(
+        ((serial, number),
+         os.path.join(cls.AUDIT_DIR, '%s_%d.audit' % (serial, number)))
+        for serial in (cls.TEST_SERIAL1, cls.TEST_SERIAL2)
+        for number in range(4))
+    # MockAtft shared by the tests that do not change its state. Any attribute
+    # a test needs to override is patched with patch.object so it is restored.
+    # The other tests use their own copy of it, from MockAtft.Copy.
+    cls.shared_atft = MockAtft()
+    # No test needs a real timer, sleep or wx event queue, so these are
+    # patched once for the whole class and the mocks are reset before each
+    # test.
+    cls.timer_patcher = patch('threading.Timer')
+    cls.mock_timer = cls.timer_patcher.start()
+    cls.sleep_patcher = patch('time.sleep')
+    cls.mock_sleep = cls.sleep_patcher.start()
+    cls.queue_event_patcher = patch('wx.QueueEvent')
+    cls.mock_queue_event = cls.queue_event_patcher.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.queue_event_patcher.stop()
+    cls.sleep_patcher.stop()
+    cls.timer_patcher.stop()
+    super(AtftTest, cls).tearDownClass()
 
   def setUp(self):
-    self.test_target_devs = []
-    self.test_dev1 = TestDeviceInfo(
-        self.TEST_SERIAL1, self.TEST_LOCATION1, ProvisionStatus.IDLE)
-    self.test_dev2 = TestDeviceInfo(
-        self.TEST_SERIAL2, self.TEST_LOCATION2, ProvisionStatus.IDLE)
-    self.test_text_window = ''
+    self.test_dev1 = self.CopyProtoDevice(self.proto_dev1)
+    self.test_dev2 = self.CopyProtoDevice(self.proto_dev2)
+    self.test_text_window = []
     self.atfa_keys = None
     self.device_map = {}
+    self.mock_timer.reset_mock()
+    self.mock_sleep.reset_mock()
+    self.mock_queue_event.reset_mock()
+    for name in self.SHARED_ATFT_MOCKS:
+      getattr(self.shared_atft, name).reset_mock()
     self.setUpPyfakefs()
 
-  def AppendTargetDevice(self, device):
-    self.test_target_devs.append(device)
+  def SilenceEvents(self, mock_atft):
+    """Replace the refresh and message event methods with no-ops.
+
+    Used by the tests that never check these calls. A test that does check one
+    of them should assign a mock to it after calling this.
 
-  def DeleteAllItems(self):
-    self.test_target_devs = []
+    Args:
+      mock_atft: The MockAtft object.
+    """
+    for name in self.SILENCED_METHODS:
+      setattr(mock_atft, name, NoOp)
+
+  @classmethod
+  def CreateProtoDevices(cls, device_specs):
+    """Create the prototype devices for a device set.
+
+    Args:
+      device_specs: A sequence of (serial, location, status, state_attrs)
+        tuples, state_attrs being the provision state attributes to set.
+    Returns:
+      A tuple of TestDeviceInfo objects, in the order of device_specs.
+    """
+    proto_devs = []
+    for serial, location, status, state_attrs in device_specs:
+      dev = TestDeviceInfo(serial, location, status)
+      for attr in state_attrs:
+        setattr(dev.provision_state, attr, True)
+      proto_devs.append(dev)
+    return tuple(proto_devs)
+
+  def CopyProtoDevice(self, proto_dev):
+    """Make a shallow copy of a prototype device with its own provision state.
+
+    Args:
+      proto_dev: The prototype TestDeviceInfo object.
+    Returns:
+      The copied TestDeviceInfo object.
+    """
+    dev = copy.copy(proto_dev)
+    dev.provision_state = copy.copy(proto_dev.provision_state)
+    return dev
 
   def testDeviceListedEventHandler(self):
     # Test atft._DeviceListedEventHandler
     # Make sure if nothing changes, we would not rerender the target list.
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft._CheckMappingMode = MagicMock()
     mock_atft.atfa_dev_output = MagicMock()
     mock_atft.last_target_list = []
     mock_atft.target_devs_output = MagicMock()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
     mock_atft.atft_manager.GetATFADevice.return_value = None
-    mock_atft.PrintToWindow = MagicMock()
+    mock_atft.PrintToWindow = Mock()
     mock_atft._HandleKeysLeft = MagicMock()
     mock_atft._PrintTargetDevices = MagicMock()
     mock_atft._PrintAtfaDevice = MagicMock()
@@ -171,29 +432,27 @@ class AtftTest(TestCase):
     mock_atft._DeviceListedEventHandler(None)
     mock_atft.atft_manager.target_devs = [self.test_dev1]
     mock_atft._DeviceListedEventHandler(None)
-    mock_atft._PrintTargetDevices.assert_called_once()
+    self.assertEqual(1, mock_atft._PrintTargetDevices.call_count)
     mock_atft._PrintTargetDevices.reset_mock()
     mock_atft.atft_manager.target_devs = [self.test_dev1, self.test_dev2]
     mock_atft._DeviceListedEventHandler(None)
-    mock_atft._PrintTargetDevices.assert_called_once()
+    self.assertEqual(1, mock_atft._PrintTargetDevices.call_count)
     mock_atft._PrintTargetDevices.reset_mock()
     mock_atft._DeviceListedEventHandler(None)
-    mock_atft._PrintTargetDevices.assert_not_called()
+    self.assertEqual(0, mock_atft._PrintTargetDevices.call_count)
     mock_atft.atft_manager.target_devs = [self.test_dev2]
     mock_atft._DeviceListedEventHandler(None)
-    mock_atft._PrintTargetDevices.assert_called_once()
+    self.assertEqual(1, mock_atft._PrintTargetDevices.call_count)
 
   def testDeviceListedEventCheckMappingMode(self):
     # Test whether to check device mapping mode.
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft._CheckMappingMode = MagicMock()
     mock_atft.atfa_dev_output = MagicMock()
     mock_atft.last_target_list = []
     mock_atft.target_devs_output = MagicMock()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
     mock_atft.atft_manager.GetATFADevice.return_value = None
-    mock_atft.PrintToWindow = MagicMock()
+    mock_atft.PrintToWindow = Mock()
     mock_atft._HandleKeysLeft = MagicMock()
     mock_atft._PrintTargetDevices = MagicMock()
     mock_atft._PrintAtfaDevice = MagicMock()
@@ -204,37 +463,58 @@ class AtftTest(TestCase):
     mock_atft.sup_mode = True
     mock_atft.app_settings_dialog.IsShown.return_value = False
     mock_atft._DeviceListedEventHandler(None)
-    mock_atft._CheckMappingMode.assert_called_once()
+    self.assertEqual(1, mock_atft._CheckMappingMode.call_count)
     mock_atft._CheckMappingMode.reset_mock()
     # Start screen shown, in supervisor mode, settings not shown.
     mock_atft.start_screen_shown = True
     mock_atft.sup_mode = True
     mock_atft.app_settings_dialog.IsShown.return_value = False
     mock_atft._DeviceListedEventHandler(None)
-    mock_atft._CheckMappingMode.assert_not_called()
+    self.assertEqual(0, mock_atft._CheckMappingMode.call_count)
      # Start screen not shown, in operator mode, settings not shown.
     mock_atft.start_screen_shown = False
     mock_atft.sup_mode = False
     mock_atft.app_settings_dialog.IsShown.return_value = False
     mock_atft._DeviceListedEventHandler(None)
-    mock_atft._CheckMappingMode.assert_not_called()
+    self.assertEqual(0, mock_atft._CheckMappingMode.call_count)
      # Start screen not shown, in supervisor mode, settings shown.
     mock_atft.start_screen_shown = False
     mock_atft.sup_mode = True
     mock_atft.app_settings_dialog.IsShown.return_value = True
     mock_atft._DeviceListedEventHandler(None)
-    mock_atft._CheckMappingMode.assert_not_called()
+    self.assertEqual(0, mock_atft._CheckMappingMode.call_count)
+
+  def _GetExpectedShowTargetDeviceCalls(
+      self, dev_components, serial_string, mapped_devs):
+    """Build the expected _ShowTargetDevice calls in multiple device mode.
+
+    Args:
+      dev_components: The mock target device components, one for each slot.
+      serial_string: The mock FIELD_SERIAL_NUMBER string.
+      mapped_devs: A dictionary from slot index to the device in that slot.
+    Returns:
+      The list of expected calls, one for each slot.
+    """
+    calls = []
+    for i, dev_component in enumerate(dev_components):
+      dev = mapped_devs.get(i)
+      if dev:
+        calls.append(call(
+            dev_component, dev.serial_number,
+            '{}: {}'.format(serial_string, dev.serial_number),
+            dev.provision_status, dev.provision_state))
+      else:
+        calls.append(call(dev_component, None, '', None, None))
+    return calls
 
   def testPrintTargetDevicesMultipleDeviceMode(self):
     # Test _PrintTargetDevices in multiple device mode.
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_serial_string = MagicMock()
     mock_atft.atft_string.FIELD_SERIAL_NUMBER = mock_serial_string
-    mock_atft.atft_manager = MagicMock()
-    mock_dev_components = []
-    for i in range(0, 6):
-      mock_dev_components.append(MagicMock())
-    mock_atft.target_devs_components = mock_dev_components;
+    mock_dev_components = [
+        MagicMock() for _ in range(mock_atft.TARGET_DEV_SIZE)]
+    mock_atft.target_devs_components = mock_dev_components
     dev1 = self.test_dev1
     dev2 = self.test_dev2
     dev1.provision_status = ProvisionStatus.IDLE
@@ -247,42 +527,27 @@ class AtftTest(TestCase):
     dev2_state.avb_locked = True
     dev2.provision_state = dev2_state
     mock_atft.atft_manager.target_devs = [dev1, dev2]
-    mock_atft.device_usb_locations = []
-    for i in range(mock_atft.TARGET_DEV_SIZE):
-      mock_atft.device_usb_locations.append(None)
+    mock_atft.device_usb_locations = list(self.EMPTY_USB_LOCATIONS)
     # Two target devices at location 0 and location 5.
     mock_atft.device_usb_locations[0] = self.TEST_LOCATION1
     mock_atft.device_usb_locations[5] = self.TEST_LOCATION2
     mock_atft._ShowTargetDevice = MagicMock()
     mock_atft._PrintTargetDevices()
-    mock_atft._ShowTargetDevice.assert_has_calls([
-        call(
-            mock_dev_components[0],
-            self.TEST_SERIAL1,
-            '{}: {}'.format(mock_serial_string, self.TEST_SERIAL1),
-            ProvisionStatus.IDLE, dev1_state),
-        call(mock_dev_components[1], None, '', None, None),
-        call(mock_dev_components[2], None, '', None, None),
-        call(mock_dev_components[3], None, '', None, None),
-        call(mock_dev_components[4], None, '', None, None),
-        call(
-            mock_dev_components[5], self.TEST_SERIAL2,
-            '{}: {}'.format(mock_serial_string, self.TEST_SERIAL2),
-            ProvisionStatus.REBOOT_IN_PROGRESS, dev2_state)
-        ])
+    self.assertEqual(
+        self._GetExpectedShowTargetDeviceCalls(
+            mock_dev_components, mock_serial_string, {0: dev1, 5: dev2}),
+        mock_atft._ShowTargetDevice.call_args_list)
 
   def testPrintTargetDevicesMultipleDeviceModeReverseOrder(self):
     # Test _PrintTargetDevices in multiple device mode with the mapped device
     # location in descending order. This test is to verify a bug that was caused
     # by the assumption that the mapped device location is in ascending order.
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_serial_string = MagicMock()
     mock_atft.atft_string.FIELD_SERIAL_NUMBER = mock_serial_string
-    mock_atft.atft_manager = MagicMock()
-    mock_dev_components = []
-    for i in range(0, 6):
-      mock_dev_components.append(MagicMock())
-    mock_atft.target_devs_components = mock_dev_components;
+    mock_dev_components = [
+        MagicMock() for _ in range(mock_atft.TARGET_DEV_SIZE)]
+    mock_atft.target_devs_components = mock_dev_components
     dev1 = self.test_dev1
     dev2 = self.test_dev2
     dev1.provision_status = ProvisionStatus.IDLE
@@ -295,38 +560,24 @@ class AtftTest(TestCase):
     dev2_state.avb_locked = True
     dev2.provision_state = dev2_state
     mock_atft.atft_manager.target_devs = [dev1, dev2]
-    mock_atft.device_usb_locations = []
-    for i in range(mock_atft.TARGET_DEV_SIZE):
-      mock_atft.device_usb_locations.append(None)
+    mock_atft.device_usb_locations = list(self.EMPTY_USB_LOCATIONS)
     # Two target devices at location 0 and location 5.
     mock_atft.device_usb_locations[0] = self.TEST_LOCATION2
     mock_atft.device_usb_locations[5] = self.TEST_LOCATION1
     mock_atft._ShowTargetDevice = MagicMock()
     mock_atft._PrintTargetDevices()
-    mock_atft._ShowTargetDevice.assert_has_calls([
-        call(
-            mock_dev_components[0],
-            self.TEST_SERIAL2,
-            '{}: {}'.format(mock_serial_string, self.TEST_SERIAL2),
-            ProvisionStatus.REBOOT_IN_PROGRESS, dev2_state),
-        call(mock_dev_components[1], None, '', None, None),
-        call(mock_dev_components[2], None, '', None, None),
-        call(mock_dev_components[3], None, '', None, None),
-        call(mock_dev_components[4], None, '', None, None),
-        call(
-            mock_dev_components[5], self.TEST_SERIAL1,
-            '{}: {}'.format(mock_serial_string, self.TEST_SERIAL1),
-            ProvisionStatus.IDLE, dev1_state)
-        ])
+    self.assertEqual(
+        self._GetExpectedShowTargetDeviceCalls(
+            mock_dev_components, mock_serial_string, {0: dev2, 5: dev1}),
+        mock_atft._ShowTargetDevice.call_args_list)
 
   def testPrintTargetDevicesSingleDeviceMode(self):
     # Test _PrintTargetDevices in single device mode.
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft.mapping_mode = mock_atft.SINGLE_DEVICE_MODE
 
     mock_serial_string = MagicMock()
     mock_atft.atft_string.FIELD_SERIAL_NUMBER = mock_serial_string
-    mock_atft.atft_manager = MagicMock()
     def mockGetTargetDevice(serial):
       for device in mock_atft.atft_manager.target_devs:
         if device.serial_number == serial:
@@ -367,10 +618,10 @@ class AtftTest(TestCase):
   # Test atft._SelectFileEventHandler
   @patch('wx.FileDialog')
   def testSelectFileEventHandler(self, mock_file_dialog):
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft
     mock_event = MagicMock()
     mock_callback = MagicMock()
-    mock_dialog = MagicMock()
+    mock_dialog = MagicMock(spec=REAL_FILE_DIALOG)
     mock_instance = MagicMock()
     mock_file_dialog.return_value = mock_instance
     mock_instance.__enter__.return_value = mock_dialog
@@ -383,10 +634,10 @@ class AtftTest(TestCase):
 
   @patch('wx.FileDialog')
   def testSelectFileEventHandlerCancel(self, mock_file_dialog):
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft
     mock_event = MagicMock()
     mock_callback = MagicMock()
-    mock_dialog = MagicMock()
+    mock_dialog = MagicMock(spec=REAL_FILE_DIALOG)
     mock_instance = MagicMock()
     mock_file_dialog.return_value = mock_instance
     mock_instance.__enter__.return_value = mock_dialog
@@ -395,151 +646,104 @@ class AtftTest(TestCase):
     mock_dialog.ShowModal.return_value = wx.ID_CANCEL
     mock_dialog.GetPath.return_value = self.TEST_TEXT
     mock_atft._SelectFileEventHandler(mock_event)
-    mock_callback.assert_not_called()
+    self.assertEqual(0, mock_callback.call_count)
 
   # Test atft.PrintToWindow
   def MockAppendText(self, text):
-    self.test_text_window += text
+    self.test_text_window.append(text)
 
   def MockClear(self):
-    self.test_text_window = ''
+    del self.test_text_window[:]
 
   def MockGetValue(self):
-    return self.test_text_window
+    return ''.join(self.test_text_window)
 
   def testPrintToWindow(self):
-    self.test_text_window = ''
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft
     mock_text_entry = MagicMock()
     mock_text_entry.AppendText.side_effect = self.MockAppendText
     mock_text_entry.Clear.side_effect = self.MockClear
     mock_text_entry.GetValue.side_effect = self.MockGetValue
     mock_atft.PrintToWindow(mock_text_entry, self.TEST_TEXT)
-    self.assertEqual(self.TEST_TEXT, self.test_text_window)
+    self.assertEqual(self.TEST_TEXT, self.MockGetValue())
     mock_atft.PrintToWindow(mock_text_entry, self.TEST_TEXT2)
-    self.assertEqual(self.TEST_TEXT2, self.test_text_window)
+    self.assertEqual(self.TEST_TEXT2, self.MockGetValue())
     mock_text_entry.AppendText.reset_mock()
     mock_atft.PrintToWindow(mock_text_entry, self.TEST_TEXT2)
     self.assertEqual(False, mock_text_entry.AppendText.called)
-    self.assertEqual(self.TEST_TEXT2, self.test_text_window)
+    self.assertEqual(self.TEST_TEXT2, self.MockGetValue())
     mock_text_entry.Clear()
     mock_atft.PrintToWindow(mock_text_entry, self.TEST_TEXT, True)
     mock_atft.PrintToWindow(mock_text_entry, self.TEST_TEXT2, True)
-    self.assertEqual(self.TEST_TEXT + self.TEST_TEXT2, self.test_text_window)
+    self.assertEqual(self.TEST_TEXT + self.TEST_TEXT2, self.MockGetValue())
 
   # Test atft.StartRefreshingDevices(), atft.StopRefresh()
   # Test atft.PauseRefresh(), atft.ResumeRefresh()
 
-  @patch('threading.Timer')
-  @patch('wx.QueueEvent')
-  def testStartRefreshingDevice(self, mock_queue_event, mock_timer):
-    mock_atft = MockAtft()
-    mock_atft.StartRefreshingDevices = types.MethodType(
-        atft.Atft.StartRefreshingDevices, mock_atft, atft.Atft)
-    mock_atft.DEVICE_REFRESH_INTERVAL = 0.01
+  def testStartRefreshingDevice(self):
+    mock_atft = self.shared_atft.Copy()
     mock_atft._ListDevices = MagicMock()
-    mock_atft.dev_listed_event = MagicMock()
-    mock_timer.side_effect = MagicMock()
 
     mock_atft.StartRefreshingDevices()
 
-    mock_atft._ListDevices.assert_called()
+    self.assertTrue(mock_atft._ListDevices.called)
+    # The refresh timer is the class-wide threading.Timer mock.
+    self.mock_timer.assert_called_once_with(
+        mock_atft.device_refresh_interval, mock_atft.StartRefreshingDevices)
     mock_atft.StopRefresh()
     self.assertEqual(None, mock_atft.refresh_timer)
 
-  @patch('threading.Timer')
-  def testPauseResumeRefreshingDevice(self, mock_timer):
-    mock_atft = MockAtft()
-    mock_atft.StartRefreshingDevices = types.MethodType(
-        atft.Atft.StartRefreshingDevices, mock_atft, atft.Atft)
-    mock_atft.DEVICE_REFRESH_INTERVAL = 0.01
+  def testPauseResumeRefreshingDevice(self):
+    mock_atft = self.shared_atft.Copy()
     mock_atft._ListDevices = MagicMock()
-    mock_atft.dev_listed_event = MagicMock()
     mock_atft._SendDeviceListedEvent = MagicMock()
-    mock_timer.side_effect = MagicMock()
 
     mock_atft.PauseRefresh()
     mock_atft.StartRefreshingDevices()
-    mock_atft._ListDevices.assert_not_called()
-    mock_atft._SendDeviceListedEvent.assert_called()
+    self.assertEqual(0, mock_atft._ListDevices.call_count)
+    self.assertTrue(mock_atft._SendDeviceListedEvent.called)
     mock_atft.ResumeRefresh()
     mock_atft.StartRefreshingDevices()
-    mock_atft._ListDevices.assert_called()
+    self.assertTrue(mock_atft._ListDevices.called)
     mock_atft.StopRefresh()
 
   # Test atft.OnEnterAutoProv
-  def testOnEnterAutoProvNormal(self):
-    mock_atft = MockAtft()
-    mock_atft.auto_prov = False
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft.atft_manager.product_info = MagicMock()
-    mock_atft.atft_manager.GetCachedATFAKeysLeft.return_value = 10
-    mock_atft.PrintToCommandWindow = MagicMock()
-    mock_atft.ShowAlert = MagicMock()
-    mock_atft.autoprov_button = MagicMock()
-    mock_atft.OnEnterAutoProv()
-    self.assertEqual(True, mock_atft.auto_prov)
-    mock_atft.ShowAlert.assert_not_called()
-
-  def testOnEnterAutoProvNoAtfa(self):
-    # Cannot enter auto provisioning mode without an ATFA device
-    mock_atft = MockAtft()
-    mock_atft.auto_prov = False
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = None
-    mock_atft.atft_manager.product_info = MagicMock()
-    mock_atft.atft_manager.GetCachedATFAKeysLeft.return_value = 10
-    mock_atft.PrintToCommandWindow = MagicMock()
-    mock_atft.ShowAlert = MagicMock()
-    mock_atft.autoprov_button = MagicMock()
-    mock_atft.OnEnterAutoProv()
-    self.assertEqual(False, mock_atft.auto_prov)
-    mock_atft.ShowAlert.assert_called_once()
-
-  def testOnEnterAutoProvNoProduct(self):
-    # Cannot enter auto provisioning mode without a product
-    mock_atft = MockAtft()
-    mock_atft.auto_prov = False
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft.atft_manager.product_info = None
-    mock_atft.atft_manager.som_info = None
-    mock_atft.atft_manager.GetCachedATFAKeysLeft.return_value = 10
-    mock_atft.PrintToCommandWindow = MagicMock()
-    mock_atft.ShowAlert = MagicMock()
-    mock_atft.autoprov_button = MagicMock()
-    mock_atft.OnEnterAutoProv()
-    self.assertEqual(False, mock_atft.auto_prov)
-    mock_atft.ShowAlert.assert_called_once()
-
-  def testOnEnterAutoProvNoKeysLeft(self):
-    # Cannot enter auto provisioning mode when no keys left
-    mock_atft = MockAtft()
-    mock_atft.auto_prov = False
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft.atft_manager.product_info = MagicMock()
-    mock_atft.atft_manager.GetCachedATFAKeysLeft.return_value = 0
-    mock_atft.PrintToCommandWindow = MagicMock()
-    mock_atft.ShowAlert = MagicMock()
-    mock_atft.autoprov_button = MagicMock()
-    mock_atft.OnEnterAutoProv()
-    self.assertEqual(False, mock_atft.auto_prov)
-    mock_atft.ShowAlert.assert_called_once()
+  def testOnEnterAutoProv(self):
+    # Each case is whether there is an ATFA device, whether there is a product,
+    # the number of keys left and whether auto provisioning mode is entered.
+    # Cannot enter auto provisioning mode without an ATFA device, without a
+    # product or when no keys left.
+    test_cases = [
+        (True, True, 10, True),
+        (False, True, 10, False),
+        (True, False, 10, False),
+        (True, True, 0, False),
+    ]
+    for has_atfa, has_product, keys_left, auto_prov in test_cases:
+      msg = str((has_atfa, has_product, keys_left))
+      mock_atft = self.shared_atft.Copy()
+      mock_atft.auto_prov = False
+      if not has_atfa:
+        mock_atft.atft_manager.GetATFADevice.return_value = None
+      if not has_product:
+        mock_atft.atft_manager.product_info = None
+        mock_atft.atft_manager.som_info = None
+      mock_atft.atft_manager.GetCachedATFAKeysLeft.return_value = keys_left
+      mock_atft.PrintToCommandWindow = MagicMock()
+      mock_atft.ShowAlert = MagicMock()
+      mock_atft.autoprov_button = MagicMock()
+      mock_atft.OnEnterAutoProv()
+      self.assertEqual(auto_prov, mock_atft.auto_prov, msg=msg)
+      expected_alerts = 0 if auto_prov else 1
+      self.assertEqual(
+          expected_alerts, mock_atft.ShowAlert.call_count, msg=msg)
 
   # Test atft.OnLeaveAutoProv
   def testLeaveAutoProvNormal(self):
     # While leaving auto prov mode, need to check device status if the device
     # is waiting.
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
     mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
     mock_atft.atft_manager.product_info = MagicMock()
     mock_atft.atft_manager.GetCachedATFAKeysLeft.return_value = 0
@@ -554,53 +758,56 @@ class AtftTest(TestCase):
     mock_atft._GetAvailableDevices.return_value = [
         test_dev1, test_dev2]
     mock_atft.atft_manager.CheckProvisionStatus.side_effect = (
-        lambda target=test_dev2, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
+        lambda target: self.MockStateChange(
+            target, ProvisionStatus.LOCKAVB_SUCCESS))
     mock_atft.OnLeaveAutoProv()
     self.assertEqual(False, mock_atft.auto_prov)
     self.assertEqual(test_dev1.provision_status,
                      ProvisionStatus.PROVISION_SUCCESS)
-    mock_atft.atft_manager.CheckProvisionStatus.assert_called_once()
+    self.assertEqual(1, mock_atft.atft_manager.CheckProvisionStatus.call_count)
     self.assertEqual(
         test_dev2.provision_status, ProvisionStatus.LOCKAVB_SUCCESS)
 
   # Test atft.OnChangeKeyThreshold
   def testOnChangeKeyThreshold(self):
-    mock_atft = MockAtft()
-    mock_atft.configs = {}
-    mock_atft.change_threshold_dialog = MagicMock()
-    mock_atft.change_threshold_dialog.ShowModal.return_value = wx.ID_OK
-    mock_atft.change_threshold_dialog.GetFirstWarning.return_value = 100
-    mock_atft.change_threshold_dialog.GetSecondWarning.return_value = 80
-    mock_atft.OnChangeKeyThreshold(None)
-    self.assertEqual('100', mock_atft.configs['DEFAULT_KEY_THRESHOLD_1'])
-    self.assertEqual('80', mock_atft.configs['DEFAULT_KEY_THRESHOLD_2'])
+    mock_atft = self.shared_atft
+    with patch.object(mock_atft, 'configs', {}), patch.object(
+        mock_atft, 'change_threshold_dialog', create=True,
+        spec=atft.ChangeThresholdDialog) as mock_dialog:
+      mock_dialog.ShowModal.return_value = wx.ID_OK
+      mock_dialog.GetFirstWarning.return_value = 100
+      mock_dialog.GetSecondWarning.return_value = 80
+      mock_atft.OnChangeKeyThreshold(None)
+      self.assertEqual('100', mock_atft.configs['DEFAULT_KEY_THRESHOLD_1'])
+      self.assertEqual('80', mock_atft.configs['DEFAULT_KEY_THRESHOLD_2'])
 
   def testOnChangeKeyThresholdOnlyFirst(self):
-    mock_atft = MockAtft()
-    mock_atft.configs = {}
-    mock_atft.change_threshold_dialog = MagicMock()
-    mock_atft.change_threshold_dialog.ShowModal.return_value = wx.ID_OK
-    mock_atft.change_threshold_dialog.GetFirstWarning.return_value = 100
-    mock_atft.change_threshold_dialog.GetSecondWarning.return_value = None
-    mock_atft.OnChangeKeyThreshold(None)
-    self.assertEqual('100', mock_atft.configs['DEFAULT_KEY_THRESHOLD_1'])
-    self.assertEqual(False, 'DEFAULT_KEY_THRESHOLD_2' in mock_atft.configs)
+    mock_atft = self.shared_atft
+    with patch.object(mock_atft, 'configs', {}), patch.object(
+        mock_atft, 'change_threshold_dialog', create=True,
+        spec=atft.ChangeThresholdDialog) as mock_dialog:
+      mock_dialog.ShowModal.return_value = wx.ID_OK
+      mock_dialog.GetFirstWarning.return_value = 100
+      mock_dialog.GetSecondWarning.return_value = None
+      mock_atft.OnChangeKeyThreshold(None)
+      self.assertEqual('100', mock_atft.configs['DEFAULT_KEY_THRESHOLD_1'])
+      self.assertEqual(False, 'DEFAULT_KEY_THRESHOLD_2' in mock_atft.configs)
 
   def testOnChangeKeyThresholdNone(self):
-    mock_atft = MockAtft()
-    mock_atft.configs = {}
-    mock_atft.change_threshold_dialog = MagicMock()
-    mock_atft.change_threshold_dialog.ShowModal.return_value = wx.ID_OK
-    mock_atft.change_threshold_dialog.GetFirstWarning.return_value = None
-    mock_atft.change_threshold_dialog.GetSecondWarning.return_value = None
-    mock_atft.OnChangeKeyThreshold(None)
-    self.assertEqual(False, 'DEFAULT_KEY_THRESHOLD_1' in mock_atft.configs)
-    self.assertEqual(False, 'DEFAULT_KEY_THRESHOLD_2' in mock_atft.configs)
+    mock_atft = self.shared_atft
+    with patch.object(mock_atft, 'configs', {}), patch.object(
+        mock_atft, 'change_threshold_dialog', create=True,
+        spec=atft.ChangeThresholdDialog) as mock_dialog:
+      mock_dialog.ShowModal.return_value = wx.ID_OK
+      mock_dialog.GetFirstWarning.return_value = None
+      mock_dialog.GetSecondWarning.return_value = None
+      mock_atft.OnChangeKeyThreshold(None)
+      self.assertEqual(False, 'DEFAULT_KEY_THRESHOLD_1' in mock_atft.configs)
+      self.assertEqual(False, 'DEFAULT_KEY_THRESHOLD_2' in mock_atft.configs)
 
   # Test atft._HandleAutoProv
   def testHandleAutoProv(self):
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
                                ProvisionStatus.PROVISION_SUCCESS)
     test_dev1.provision_state.bootloader_locked = True
@@ -629,67 +836,46 @@ class AtftTest(TestCase):
     keys_left_array.append(10)
 
   def testHandleKeysLeft(self):
-    mock_atft = MockAtft()
-    mock_title = MagicMock()
-    mock_atft.atft_string.TITLE_KEYS_LEFT = mock_title
-    mock_atft._SetStatusTextColor = MagicMock()
-    mock_atft.change_threshold_dialog = MagicMock()
-    mock_atft.change_threshold_dialog.GetFirstWarning.return_value = None
-    mock_atft.change_threshold_dialog.GetSecondWarning.return_value = None
-    keys_left_array = []
-    mock_atft.atft_manager.GetCachedATFAKeysLeft = MagicMock()
-    mock_atft.atft_manager.GetCachedATFAKeysLeft.side_effect = (
-        lambda: self.MockGetKeysLeft(keys_left_array))
-    mock_atft.atft_manager.UpdateATFAKeysLeft.side_effect = (
-        lambda is_som_key: self.MockSetKeysLeft(keys_left_array))
-    mock_atft._HandleKeysLeft()
-    mock_atft._SetStatusTextColor.assert_called_once_with(
-        mock_title + '10', COLOR_BLACK)
-
-  def testHandleKeysLeftKeysNotNone(self):
-    mock_atft = MockAtft()
-    mock_title = MagicMock()
-    mock_atft.atft_string.TITLE_KEYS_LEFT = mock_title
-    mock_atft._SetStatusTextColor = MagicMock()
-    mock_atft.change_threshold_dialog = MagicMock()
-    mock_atft.change_threshold_dialog.GetFirstWarning.return_value = None
-    mock_atft.change_threshold_dialog.GetSecondWarning.return_value = None
-    keys_left_array = [10]
-    mock_atft.atft_manager.GetCachedATFAKeysLeft = MagicMock()
-    mock_atft.atft_manager.GetCachedATFAKeysLeft.side_effect = (
-        lambda: self.MockGetKeysLeft(keys_left_array))
-    mock_atft._HandleKeysLeft()
-    mock_atft._SetStatusTextColor.assert_called_once_with(
-        mock_title + '10', COLOR_BLACK)
-    mock_atft.atft_manager.UpdateATFAKeysLeft.assert_not_called()
-
-  def testHandleKeysLeftKeysNone(self):
-    mock_atft = MockAtft()
-    mock_title = MagicMock()
-    mock_atft.atft_string.TITLE_KEYS_LEFT = mock_title
-    mock_atft._SetStatusTextColor = MagicMock()
-    mock_atft.change_threshold_dialog = MagicMock()
-    mock_atft.change_threshold_dialog.GetFirstWarning.return_value = None
-    mock_atft.change_threshold_dialog.GetSecondWarning.return_value = None
-    keys_left_array = []
-    mock_atft.atft_manager.GetCachedATFAKeysLeft = MagicMock()
-    mock_atft.atft_manager.GetCachedATFAKeysLeft.return_value = 0
-    mock_atft._HandleKeysLeft()
-    mock_atft._SetStatusTextColor.assert_called_once_with(
-        mock_title + '0', COLOR_BLACK)
+    # Each case is the cached keys left before the call, the keys left shown
+    # and whether the keys left need to be updated from the ATFA device.
+    test_cases = [
+        ([], '10', True),
+        ([10], '10', False),
+        ([0], '0', False),
+    ]
+    for cached_keys_left, keys_left_text, updated in test_cases:
+      msg = str(cached_keys_left)
+      mock_atft = self.shared_atft.Copy()
+      mock_title = MagicMock()
+      mock_atft.atft_string.TITLE_KEYS_LEFT = mock_title
+      mock_atft._SetStatusTextColor = Mock()
+      mock_atft.change_threshold_dialog = MagicMock(
+          spec=atft.ChangeThresholdDialog)
+      mock_atft.change_threshold_dialog.GetFirstWarning.return_value = None
+      mock_atft.change_threshold_dialog.GetSecondWarning.return_value = None
+      keys_left_array = list(cached_keys_left)
+      mock_atft.atft_manager.GetCachedATFAKeysLeft.side_effect = (
+          lambda: self.MockGetKeysLeft(keys_left_array))
+      mock_atft.atft_manager.UpdateATFAKeysLeft.side_effect = (
+          lambda is_som_key: self.MockSetKeysLeft(keys_left_array))
+      mock_atft._HandleKeysLeft()
+      mock_atft._SetStatusTextColor.assert_called_once_with(
+          mock_title + keys_left_text, COLOR_BLACK)
+      self.assertEqual(
+          updated, mock_atft.atft_manager.UpdateATFAKeysLeft.called, msg=msg)
 
   # The statusbar should change color if the key is lower than threshold.
   def testHandleKeysLeftChangeStatusColor(self):
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_title = MagicMock()
     mock_atft.atft_string.TITLE_KEYS_LEFT = mock_title
-    mock_atft._SetStatusTextColor = MagicMock()
-    mock_atft.change_threshold_dialog = MagicMock()
+    mock_atft._SetStatusTextColor = Mock()
+    mock_atft.change_threshold_dialog = MagicMock(
+        spec=atft.ChangeThresholdDialog)
     mock_atft.change_threshold_dialog.GetFirstWarning.return_value = 11
     mock_atft.change_threshold_dialog.GetSecondWarning.return_value = 10
     # past first warning.
     keys_left_array = [10]
-    mock_atft.atft_manager.GetCachedATFAKeysLeft = MagicMock()
     mock_atft.atft_manager.GetCachedATFAKeysLeft.side_effect = (
         lambda: self.MockGetKeysLeft(keys_left_array))
     mock_atft._HandleKeysLeft()
@@ -707,158 +893,103 @@ class AtftTest(TestCase):
         mock_title + '9', COLOR_RED)
 
   # Test atft._HandleStateTransition
-  def MockStateChange(self, target, state):
+  @staticmethod
+  def MockStateChange(target, state):
     if ProvisionStatus.isFailed(state):
       target.provision_status = state
       return
-    if state == ProvisionStatus.REBOOT_SUCCESS:
-      target.provision_state.bootloader_locked = True
-    if state == ProvisionStatus.FUSEATTR_SUCCESS:
-      target.provision_state.avb_perm_attr_set = True
-    if state == ProvisionStatus.LOCKAVB_SUCCESS:
-      target.provision_state.avb_locked = True
-    if state == ProvisionStatus.PROVISION_SUCCESS:
-      target.provision_state.product_provisioned = True
-    if state == ProvisionStatus.UNLOCKAVB_SUCCESS:
-      target.provision_state.avb_locked = False
-    if target.provision_state.product_provisioned:
-      target.provision_status = ProvisionStatus.PROVISION_SUCCESS
-      return
-    if target.provision_state.avb_locked:
-      target.provision_status = ProvisionStatus.LOCKAVB_SUCCESS
-      return
-    if target.provision_state.avb_perm_attr_set:
-      target.provision_status = ProvisionStatus.FUSEATTR_SUCCESS
-      return
-    if target.provision_state.bootloader_locked:
-      target.provision_status = ProvisionStatus.FUSEVBOOT_SUCCESS
-
-  def testHandleStateTransition(self):
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-        state=ProvisionStatus.PROVISION_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    self.assertEqual(ProvisionStatus.PROVISION_SUCCESS,
-                     test_dev1.provision_status)
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
-
-  def testHandleStateTransitionSameDevice(self):
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-        state=ProvisionStatus.PROVISION_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1, self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    self.assertEqual(ProvisionStatus.PROVISION_SUCCESS,
-                     test_dev1.provision_status)
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
-
-  def testHandleStateTransitionFuseVbootFail(self):
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEVBOOT_FAILED:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-        state=ProvisionStatus.PROVISION_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
+    provision_state = target.provision_state
+    effect = STATE_CHANGE_EFFECTS.get(state)
+    if effect:
+      setattr(provision_state, effect[0], effect[1])
+    for attr, status in STATE_CHANGE_STATUS:
+      if getattr(provision_state, attr):
+        target.provision_status = status
+        return
+
+  def _CreateStateTransitionAtft(
+      self, test_dev, serials,
+      fuse_vboot_state=ProvisionStatus.REBOOT_SUCCESS,
+      fuse_attr_state=ProvisionStatus.FUSEATTR_SUCCESS,
+      lock_avb_state=ProvisionStatus.LOCKAVB_SUCCESS,
+      provision_state=ProvisionStatus.PROVISION_SUCCESS,
+      unlock_avb_state=ProvisionStatus.UNLOCKAVB_SUCCESS,
+      provision_steps=None):
+    """Create a MockAtft whose provision operations change the target state.
+
+    Args:
+      test_dev: The target device returned by GetTargetDevice.
+      serials: The serial numbers in auto provision mode.
+      fuse_vboot_state: The status after fusing vboot key.
+      fuse_attr_state: The status after fusing permanent attributes.
+      lock_avb_state: The status after locking avb.
+      provision_state: The status after provisioning key.
+      unlock_avb_state: The status after unlocking avb.
+      provision_steps: The provision steps, None for the default steps.
+    Returns:
+      The MockAtft object.
+    """
+    mock_atft = self.shared_atft.Copy()
+    mock_atft._SendOperationSucceedEvent = Mock()
+    mock_atft._FuseVbootKeyTarget = Mock(
+        side_effect=lambda target, auto_prov: self.MockStateChange(
+            target, fuse_vboot_state))
+    mock_atft._FusePermAttrTarget = Mock(
+        side_effect=lambda target, auto_prov: self.MockStateChange(
+            target, fuse_attr_state))
+    mock_atft._LockAvbTarget = Mock(
+        side_effect=lambda target, auto_prov: self.MockStateChange(
+            target, lock_avb_state))
+    mock_atft._ProvisionTarget = Mock(
+        side_effect=lambda target, is_som_key, auto_prov: self.MockStateChange(
+            target, provision_state))
+    mock_atft._UnlockAvbTarget = Mock(
+        side_effect=lambda target, auto_prov: self.MockStateChange(
+            target, unlock_avb_state))
+    if provision_steps is not None:
+      mock_atft.provision_steps = provision_steps
+    mock_atft.auto_dev_serials = serials
     mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    self.assertEqual(ProvisionStatus.FUSEVBOOT_FAILED,
-                     test_dev1.provision_status)
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
+    mock_atft.atft_manager = FakeAtftManager()
+    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev
+    return mock_atft
 
-  def testHandleStateTransitionRebootFail(self):
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_FAILED:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-        state=ProvisionStatus.PROVISION_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    self.assertEqual(ProvisionStatus.REBOOT_FAILED, test_dev1.provision_status)
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
+  def testHandleStateTransition(self):
+    # The device is listed once, or twice in auto provision mode.
+    for serials in ([self.TEST_SERIAL1],
+                    [self.TEST_SERIAL1, self.TEST_SERIAL1]):
+      test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
+                                 ProvisionStatus.WAITING)
+      mock_atft = self._CreateStateTransitionAtft(test_dev1, serials)
+      mock_atft._HandleStateTransition(test_dev1)
+      self.assertEqual(ProvisionStatus.PROVISION_SUCCESS,
+                       test_dev1.provision_status, msg=serials)
+      self.assertEqual(
+          1, mock_atft._SendOperationSucceedEvent.call_count, msg=serials)
+
+  def testHandleStateTransitionFail(self):
+    # Each case is the failed step and the status the device stops at.
+    test_cases = [
+        ({'fuse_vboot_state': ProvisionStatus.FUSEVBOOT_FAILED},
+         ProvisionStatus.FUSEVBOOT_FAILED),
+        ({'fuse_vboot_state': ProvisionStatus.REBOOT_FAILED},
+         ProvisionStatus.REBOOT_FAILED),
+        ({'fuse_attr_state': ProvisionStatus.FUSEATTR_FAILED},
+         ProvisionStatus.FUSEATTR_FAILED),
+        ({'lock_avb_state': ProvisionStatus.LOCKAVB_FAILED},
+         ProvisionStatus.LOCKAVB_FAILED),
+        ({'provision_state': ProvisionStatus.PROVISION_FAILED},
+         ProvisionStatus.PROVISION_FAILED),
+    ]
+    for states, expected_status in test_cases:
+      test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
+                                 ProvisionStatus.WAITING)
+      mock_atft = self._CreateStateTransitionAtft(
+          test_dev1, [self.TEST_SERIAL1], **states)
+      mock_atft._HandleStateTransition(test_dev1)
+      self.assertEqual(expected_status, test_dev1.provision_status,
+                       msg=str(states))
+      self.assertEqual(0, mock_atft._SendOperationSucceedEvent.call_count)
 
   def mockGetTargetDeviceDisappear(self, dev):
     # If the device disappear, return None as target device.
@@ -873,36 +1004,18 @@ class AtftTest(TestCase):
 
   # Test device reboot timeout and disappear from device list.
   def testHandleStateTransitionRebootTimeout(self):
-    mock_atft = MockAtft()
     self.target_device_disapper = False
-    mock_atft._SendOperationSucceedEvent = MagicMock()
     test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
                                ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
+    mock_atft = self._CreateStateTransitionAtft(
+        test_dev1, [self.TEST_SERIAL1])
     mock_atft._FuseVbootKeyTarget.side_effect = self.mockDeviceRebootTimeout
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-            state=ProvisionStatus.PROVISION_SUCCESS:
-            self.MockStateChange(target, state))
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
     mock_atft.atft_manager.GetTargetDevice.side_effect = (
         lambda serial, dev=test_dev1: self.mockGetTargetDeviceDisappear(dev))
     mock_atft._HandleStateTransition(test_dev1)
     self.assertEqual(
         None, mock_atft.atft_manager.GetTargetDevice(self.TEST_SERIAL1))
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
+    self.assertEqual(0, mock_atft._SendOperationSucceedEvent.call_count)
 
   def mockGetTargetDeviceFuseVbootFailed(self, dev):
     # If the device disappear, return None as target device.
@@ -921,30 +1034,12 @@ class AtftTest(TestCase):
   # Test fuse vboot key change target device state by creating a new target
   # device instead of modifying the original one's state.
   def testHandleStateTransitionTargetDeviceChange(self):
-    mock_atft = MockAtft()
     self.target_device_fuse_failed = False
-    mock_atft._SendOperationSucceedEvent = MagicMock()
     test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
                                ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
+    mock_atft = self._CreateStateTransitionAtft(
+        test_dev1, [self.TEST_SERIAL1])
     mock_atft._FuseVbootKeyTarget.side_effect = self.mockDeviceFuseVbootFailed
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-            state=ProvisionStatus.PROVISION_SUCCESS:
-            self.MockStateChange(target, state))
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
     mock_atft.atft_manager.GetTargetDevice.side_effect = (
         lambda serial, dev=test_dev1: self.mockGetTargetDeviceFuseVbootFailed(
             dev))
@@ -958,353 +1053,125 @@ class AtftTest(TestCase):
         ProvisionStatus.FUSEVBOOT_FAILED,
         mock_atft.atft_manager.GetTargetDevice(
             self.TEST_SERIAL1).provision_status)
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
+    self.assertEqual(0, mock_atft._SendOperationSucceedEvent.call_count)
     # Next operation should not execute.
-    mock_atft._FusePermAttrTarget.assert_not_called()
-
-  def testHandleStateTransitionFuseAttrFail(self):
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_FAILED:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-            state=ProvisionStatus.PROVISION_SUCCESS:
-            self.MockStateChange(target, state))
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    self.assertEqual(ProvisionStatus.FUSEATTR_FAILED,
-                     test_dev1.provision_status)
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
-
-  def testHandleStateTransitionLockAVBFail(self):
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_FAILED:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-            state=ProvisionStatus.PROVISION_SUCCESS:
-            self.MockStateChange(target, state))
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    self.assertEqual(ProvisionStatus.LOCKAVB_FAILED, test_dev1.provision_status)
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
-
-  def testHandleStateTransitionProvisionFail(self):
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-            state=ProvisionStatus.PROVISION_FAILED:
-            self.MockStateChange(target, state))
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    self.assertEqual(ProvisionStatus.PROVISION_FAILED,
-                     test_dev1.provision_status)
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
+    self.assertEqual(0, mock_atft._FusePermAttrTarget.call_count)
 
   def testHandleStateTransitionSkipStep(self):
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
     test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
                                ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-            state=ProvisionStatus.PROVISION_SUCCESS:
-            self.MockStateChange(target, state))
+    mock_atft = self._CreateStateTransitionAtft(
+        test_dev1, [self.TEST_SERIAL1])
 
     # The device has bootloader_locked and avb_locked set. Should fuse perm attr
     # and provision key.
     test_dev1.provision_state.bootloader_locked = True
     test_dev1.provision_state.avb_locked = True
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
     mock_atft._HandleStateTransition(test_dev1)
     self.assertEqual(ProvisionStatus.PROVISION_SUCCESS,
                      test_dev1.provision_status)
-    mock_atft._FusePermAttrTarget.assert_called_once()
-    mock_atft._ProvisionTarget.assert_called_once()
+    self.assertEqual(1, mock_atft._FusePermAttrTarget.call_count)
+    self.assertEqual(1, mock_atft._ProvisionTarget.call_count)
     self.assertEqual(True, test_dev1.provision_state.bootloader_locked)
     self.assertEqual(True, test_dev1.provision_state.avb_perm_attr_set)
     self.assertEqual(True, test_dev1.provision_state.avb_locked)
     self.assertEqual(True, test_dev1.provision_state.product_provisioned)
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
-
-  def testHandleStateTransitionIncludeUnlock(self):
-    """Test the provision_steps that unlock avb after provisioning.
-
-    We assume that the device would be locked avb during fuse vboot key and
-    we want the final state to be avb unlocked.
-    """
-    mock_atft = MockAtft()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-        state=ProvisionStatus.PROVISION_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._UnlockAvbTarget = MagicMock()
-    mock_atft._UnlockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.UNLOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-
-    mock_atft.provision_steps = ['FuseVbootKey', 'FusePermAttr', 'LockAvb',
-         'ProvisionProduct', 'UnlockAvb']
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    mock_atft._FuseVbootKeyTarget.assert_called_once()
-    mock_atft._LockAvbTarget.assert_called_once()
-    mock_atft._UnlockAvbTarget.assert_called_once()
-    mock_atft._FusePermAttrTarget.assert_called_once()
-    mock_atft._ProvisionTarget.assert_called_once()
-    self.assertEqual(True, test_dev1.provision_state.bootloader_locked)
-    self.assertEqual(True, test_dev1.provision_state.avb_perm_attr_set)
-    self.assertEqual(False, test_dev1.provision_state.avb_locked)
-    self.assertEqual(True, test_dev1.provision_state.product_provisioned)
-    self.assertEqual(
-        ProvisionStatus.PROVISION_SUCCESS, test_dev1.provision_status)
-    self.assertEqual(
-        True, mock_atft._is_provision_steps_finished(test_dev1.provision_state))
-
-  def testHandleStateTransitionLockUnlockLock(self):
-    mock_atft = MockAtft()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-        state=ProvisionStatus.PROVISION_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._UnlockAvbTarget = MagicMock()
-    mock_atft._UnlockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.UNLOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-
-    mock_atft.provision_steps = ['FuseVbootKey', 'FusePermAttr', 'LockAvb',
-         'ProvisionProduct', 'UnlockAvb', 'LockAvb', 'UnlockAvb']
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    self.assertEqual(True, test_dev1.provision_state.bootloader_locked)
-    self.assertEqual(True, test_dev1.provision_state.avb_perm_attr_set)
-    self.assertEqual(False, test_dev1.provision_state.avb_locked)
-    self.assertEqual(True, test_dev1.provision_state.product_provisioned)
-    self.assertEqual(
-        ProvisionStatus.PROVISION_SUCCESS, test_dev1.provision_status)
-    self.assertEqual(
-        True, mock_atft._is_provision_steps_finished(test_dev1.provision_state))
+    self.assertEqual(1, mock_atft._SendOperationSucceedEvent.call_count)
 
-  def testHandleStateTransitionReorder(self):
-    """Test the provision_steps that has been reordered.
+  def testHandleStateTransitionProvisionSteps(self):
+    """Test customized provision_steps.
 
-    We should make sure all the steps are executed even if they are reordered.
+    The cases cover unlocking avb after provisioning (we assume that the device
+    would be locked avb during fuse vboot key and we want the final state to be
+    avb unlocked), locking and unlocking avb twice, reordered steps which
+    should all be executed, and steps that do not provision key.
     """
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_porov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-        state=ProvisionStatus.PROVISION_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-
-    mock_atft.provision_steps = ['FusePermAttr', 'FuseVbootKey', 'ProvisionProduct',
-                                 'LockAvb']
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    mock_atft._FuseVbootKeyTarget.assert_called_once()
-    mock_atft._LockAvbTarget.assert_called_once()
-    mock_atft._FusePermAttrTarget.assert_called_once()
-    mock_atft._ProvisionTarget.assert_called_once()
-    self.assertEqual(True, test_dev1.provision_state.bootloader_locked)
-    self.assertEqual(True, test_dev1.provision_state.avb_perm_attr_set)
-    self.assertEqual(True, test_dev1.provision_state.avb_locked)
-    self.assertEqual(True, test_dev1.provision_state.product_provisioned)
-    self.assertEqual(
-        ProvisionStatus.PROVISION_SUCCESS, test_dev1.provision_status)
-    self.assertEqual(
-        True, mock_atft._is_provision_steps_finished(test_dev1.provision_state))
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
-
-  def testHandleStateTransitionNoProvision(self):
-    """Test the provision_steps that does not provision key.
-    """
-    mock_atft = MockAtft()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.WAITING)
-    mock_atft._FuseVbootKeyTarget = MagicMock()
-    mock_atft._FuseVbootKeyTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.REBOOT_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._FusePermAttrTarget = MagicMock()
-    mock_atft._FusePermAttrTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.FUSEATTR_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._ProvisionTarget = MagicMock()
-    mock_atft._ProvisionTarget.side_effect = (
-        lambda target, is_som_key, auto_prov,
-        state=ProvisionStatus.PROVISION_SUCCESS:
-        self.MockStateChange(target, state))
-    mock_atft._LockAvbTarget = MagicMock()
-    mock_atft._LockAvbTarget.side_effect = (
-        lambda target, auto_prov, state=ProvisionStatus.LOCKAVB_SUCCESS:
-        self.MockStateChange(target, state))
-
-    mock_atft.provision_steps = ['FusePermAttr', 'FuseVbootKey', 'LockAvb']
-    mock_atft.auto_dev_serials = [self.TEST_SERIAL1]
-    mock_atft.auto_prov = True
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.return_value = test_dev1
-    mock_atft._HandleStateTransition(test_dev1)
-    mock_atft._FuseVbootKeyTarget.assert_called_once()
-    mock_atft._LockAvbTarget.assert_called_once()
-    mock_atft._FusePermAttrTarget.assert_called_once()
-    mock_atft._ProvisionTarget.assert_not_called()
-    self.assertEqual(True, test_dev1.provision_state.bootloader_locked)
-    self.assertEqual(True, test_dev1.provision_state.avb_perm_attr_set)
-    self.assertEqual(True, test_dev1.provision_state.avb_locked)
-    self.assertEqual(False, test_dev1.provision_state.product_provisioned)
-    self.assertEqual(
-        ProvisionStatus.LOCKAVB_SUCCESS, test_dev1.provision_status)
-    self.assertEqual(
-        True, mock_atft._is_provision_steps_finished(test_dev1.provision_state))
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
+    # Each case is the provision steps, the number of calls to each operation
+    # in the order of (_FuseVbootKeyTarget, _FusePermAttrTarget,
+    # _LockAvbTarget, _ProvisionTarget, _UnlockAvbTarget), the final
+    # (bootloader_locked, avb_perm_attr_set, avb_locked, product_provisioned)
+    # and the final status.
+    test_cases = [
+        (['FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct',
+          'UnlockAvb'],
+         (1, 1, 1, 1, 1), (True, True, False, True),
+         ProvisionStatus.PROVISION_SUCCESS),
+        (['FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct',
+          'UnlockAvb', 'LockAvb', 'UnlockAvb'],
+         (1, 1, 2, 1, 2), (True, True, False, True),
+         ProvisionStatus.PROVISION_SUCCESS),
+        (['FusePermAttr', 'FuseVbootKey', 'ProvisionProduct', 'LockAvb'],
+         (1, 1, 1, 1, 0), (True, True, True, True),
+         ProvisionStatus.PROVISION_SUCCESS),
+        (['FusePermAttr', 'FuseVbootKey', 'LockAvb'],
+         (1, 1, 1, 0, 0), (True, True, True, False),
+         ProvisionStatus.LOCKAVB_SUCCESS),
+    ]
+    for steps, call_counts, final_state, expected_status in test_cases:
+      test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
+                                 ProvisionStatus.WAITING)
+      mock_atft = self._CreateStateTransitionAtft(
+          test_dev1, [self.TEST_SERIAL1], provision_steps=steps)
+      mock_atft._HandleStateTransition(test_dev1)
+      msg = str(steps)
+      self.assertEqual(
+          call_counts,
+          (mock_atft._FuseVbootKeyTarget.call_count,
+           mock_atft._FusePermAttrTarget.call_count,
+           mock_atft._LockAvbTarget.call_count,
+           mock_atft._ProvisionTarget.call_count,
+           mock_atft._UnlockAvbTarget.call_count), msg=msg)
+      state = test_dev1.provision_state
+      self.assertEqual(
+          final_state,
+          (state.bootloader_locked, state.avb_perm_attr_set, state.avb_locked,
+           state.product_provisioned), msg=msg)
+      self.assertEqual(expected_status, test_dev1.provision_status, msg=msg)
+      self.assertEqual(
+          True, mock_atft._is_provision_steps_finished(state), msg=msg)
+      self.assertEqual(
+          1, mock_atft._SendOperationSucceedEvent.call_count, msg=msg)
+
+  # Test atft._is_provision_steps_finished
+  def testIsProvisionStepsFinished(self):
+    mock_atft = self.shared_atft
+    # Each case is the provision steps, the provision state attributes set on
+    # the device and whether the steps are finished.
+    test_cases = [
+        (['FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct'],
+         self.AVB_LOCKED + ('product_provisioned',), True),
+        (['FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct'],
+         self.AVB_LOCKED, False),
+        (['FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct',
+          'UnlockAvb'],
+         self.PERM_ATTR_SET + ('product_provisioned',), True),
+        (['FuseVbootKey', 'FusePermAttr', 'LockAvb', 'ProvisionProduct',
+          'UnlockAvb'],
+         self.AVB_LOCKED + ('product_provisioned',), False),
+        (['FuseVbootKey', 'ProvisionSom'],
+         self.BOOTLOADER_LOCKED + ('som_provisioned',), True),
+        (['FuseVbootKey', 'ProvisionSom'], self.BOOTLOADER_LOCKED, False),
+        # Attributes that no step changes are not checked.
+        (['FuseVbootKey'], self.AVB_LOCKED, True),
+        ([], (), True),
+    ]
+    for steps, state_attrs, finished in test_cases:
+      provision_state = ProvisionState()
+      for attr in state_attrs:
+        setattr(provision_state, attr, True)
+      with patch.object(mock_atft, 'provision_steps', steps):
+        self.assertEqual(
+            finished, mock_atft._is_provision_steps_finished(provision_state),
+            msg='%s %s' % (steps, state_attrs))
 
   # Test atft._UpdateKeysLeftInATFA
   def testUpdateATFAKeysLeft(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
     mock_atft._UpdateKeysLeftInATFA()
-    mock_atft.atft_manager.UpdateATFAKeysLeft.assert_called()
+    self.assertTrue(mock_atft.atft_manager.UpdateATFAKeysLeft.called)
 
   # Test atft._FuseVbootKey
-  def MockGetTargetDevice(self, serial):
-    return self.device_map.get(serial)
-
   def MockReboot(self, target, timeout, success, fail, skip_reboot):
     success()
     target.provision_state.bootloader_locked = True
@@ -1313,278 +1180,104 @@ class AtftTest(TestCase):
     success()
     target.provision_state.bootloader_locked = False
 
-  @patch('wx.QueueEvent')
-  @patch('time.sleep')
-  def testFuseVbootKey(self, mock_sleep, mock_queue_event):
-    mock_atft = MockAtft()
-    mock_atft.dev_listed_event = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_atft._SendMessageEvent = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.side_effect = (
-        self.MockGetTargetDevice)
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.IDLE)
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEVBOOT_FAILED)
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEVBOOT_SUCCESS)
-    test_dev3.provision_state.bootloader_locked = True
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    serials = [self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3]
+  def CreateDevices(self, proto_devs):
+    """Copy prototype devices and map their serial numbers to the copies.
+
+    Args:
+      proto_devs: A sequence of prototype TestDeviceInfo objects.
+    Returns:
+      The list of copied TestDeviceInfo objects, in the order of proto_devs.
+    """
+    devices = []
+    for proto_dev in proto_devs:
+      dev = self.CopyProtoDevice(proto_dev)
+      self.device_map[dev.serial_number] = dev
+      devices.append(dev)
+    return devices
+
+  def _CreateTargetOperationAtft(self):
+    """Create a MockAtft for the tests of the target device operations.
+
+    The MockAtft is a copy of shared_atft with its events silenced. Its
+    atft_manager is a FakeAtftManager that looks the target devices up in
+    self.device_map, and _HandleException is a mock.
+
+    Returns:
+      The MockAtft object.
+    """
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
+    mock_atft.atft_manager = FakeAtftManager()
+    mock_atft.atft_manager.GetTargetDevice = self.device_map.get
+    mock_atft._HandleException = Mock()
+    return mock_atft
+
+  def testFuseVbootKey(self):
+    mock_atft = self._CreateTargetOperationAtft()
+    test_dev1, test_dev2, _ = self.CreateDevices(self.fuse_vboot_protos)
     mock_atft.atft_manager.Reboot.side_effect = self.MockReboot
-    mock_atft._FuseVbootKey(serials)
-    calls = [call(test_dev1), call(test_dev2)]
-    mock_atft.atft_manager.FuseVbootKey.assert_has_calls(calls)
+    mock_atft._FuseVbootKey(self.THREE_SERIALS)
+    self.assertEqual(
+        [call(test_dev1), call(test_dev2)],
+        mock_atft.atft_manager.FuseVbootKey.call_args_list)
     self.assertEqual(2, mock_atft.atft_manager.Reboot.call_count)
-    mock_queue_event.assert_called()
-
-  @patch('wx.QueueEvent')
-  @patch('time.sleep')
-  def testFuseVbootKeyExceptions(self, mock_sleep, mock_queue_event):
-    mock_atft = MockAtft()
-    mock_atft.dev_listed_event = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_atft._SendMessageEvent = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.side_effect = (
-        self.MockGetTargetDevice)
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.IDLE)
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEVBOOT_FAILED)
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEVBOOT_SUCCESS)
-    test_dev3.provision_state.bootloader_locked = True
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    serials = [self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3]
-    mock_atft.atft_manager.Reboot.side_effect = self.MockReboot
-    mock_atft.atft_manager.FuseVbootKey.side_effect = (
-        fastboot_exceptions.ProductNotSpecifiedException)
-    mock_atft._FuseVbootKey(serials)
-    self.assertEqual(2, mock_atft._HandleException.call_count)
-    mock_queue_event.assert_not_called()
-
-    # Reset states.
-    mock_atft._HandleException.reset_mock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.IDLE)
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEVBOOT_FAILED)
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEVBOOT_SUCCESS)
-    test_dev3.provision_state.bootloader_locked = True
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    serials = [self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3]
-    mock_atft.atft_manager.FuseVbootKey.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
-    mock_atft._FuseVbootKey(serials)
-    self.assertEqual(2, mock_atft._HandleException.call_count)
-
-    # Reset states, test reboot failure
-    mock_atft._HandleException.reset_mock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.IDLE)
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEVBOOT_FAILED)
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEVBOOT_SUCCESS)
-    test_dev3.provision_state.bootloader_locked = True
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    serials = [self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3]
-    mock_atft.atft_manager.Reboot.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
-    mock_atft.atft_manager.FuseVbootKey = MagicMock()
-    mock_atft._FuseVbootKey(serials)
-    self.assertEqual(2, mock_atft._HandleException.call_count)
+    self.assertTrue(self.mock_queue_event.called)
+
+  def testFuseVbootKeyExceptions(self):
+    mock_atft = self._CreateTargetOperationAtft()
+    # (fuse exception, reboot exception, whether the devices get rebooted)
+    test_cases = (
+        (fastboot_exceptions.ProductNotSpecifiedException, None, False),
+        (FASTBOOT_FAILURE, None, False),
+        (None, FASTBOOT_FAILURE, True),
+    )
+    for fuse_exception, reboot_exception, rebooted in test_cases:
+      self.CreateDevices(self.fuse_vboot_protos)
+      mock_atft._HandleException.reset_mock()
+      self.mock_queue_event.reset_mock()
+      mock_atft.atft_manager.FuseVbootKey.side_effect = fuse_exception
+      mock_atft.atft_manager.Reboot.side_effect = (
+          reboot_exception or self.MockReboot)
+      mock_atft._FuseVbootKey(self.THREE_SERIALS)
+      msg = 'fuse: %r, reboot: %r' % (fuse_exception, reboot_exception)
+      self.assertEqual(2, mock_atft._HandleException.call_count, msg=msg)
+      self.assertEqual(rebooted, self.mock_queue_event.called, msg=msg)
 
   # Test atft._FusePermAttr
   def testFusePermAttr(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_atft._SendMessageEvent = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.side_effect = (
-        self.MockGetTargetDevice)
-    test_dev1 = TestDeviceInfo(
-        self.TEST_SERIAL1, self.TEST_LOCATION1,
-        ProvisionStatus.FUSEVBOOT_SUCCESS)
-    test_dev1.provision_state.bootloader_locked = True
-    test_dev2 = TestDeviceInfo(
-        self.TEST_SERIAL2, self.TEST_LOCATION2,
-        ProvisionStatus.REBOOT_SUCCESS)
-    test_dev2.provision_state.bootloader_locked = True
-    test_dev3 = TestDeviceInfo(
-        self.TEST_SERIAL3, self.TEST_LOCATION2,
-        ProvisionStatus.FUSEATTR_FAILED)
-    test_dev3.provision_state.bootloader_locked = True
-    test_dev4 = TestDeviceInfo(
-        self.TEST_SERIAL4, self.TEST_LOCATION2,
-        ProvisionStatus.FUSEATTR_SUCCESS)
-    test_dev4.provision_state.bootloader_locked = True
-    test_dev4.provision_state.avb_perm_attr_set = True
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    self.device_map[self.TEST_SERIAL4] = test_dev4
-    serials = [
-        self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3,
-        self.TEST_SERIAL4
-    ]
-    mock_atft._FusePermAttr(serials)
-    calls = [call(test_dev1), call(test_dev2), call(test_dev3)]
-    mock_atft.atft_manager.FusePermAttr.assert_has_calls(calls)
+    mock_atft = self._CreateTargetOperationAtft()
+    test_dev1, test_dev2, test_dev3, _ = self.CreateDevices(
+        self.fuse_attr_protos)
+    mock_atft._FusePermAttr(self.FOUR_SERIALS)
+    self.assertEqual(
+        [call(test_dev1), call(test_dev2), call(test_dev3)],
+        mock_atft.atft_manager.FusePermAttr.call_args_list)
 
   def testFusePermAttrExceptions(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_atft._SendMessageEvent = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.side_effect = (
-        self.MockGetTargetDevice)
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.FUSEVBOOT_SUCCESS)
-    test_dev1.provision_state.bootloader_locked = True
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.REBOOT_SUCCESS)
-    test_dev2.provision_state.bootloader_locked = True
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEATTR_FAILED)
-    test_dev3.provision_state.bootloader_locked = True
-    test_dev4 = TestDeviceInfo(self.TEST_SERIAL4, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEATTR_SUCCESS)
-    test_dev4.provision_state.bootloader_locked = True
-    test_dev4.provision_state.avb_perm_attr_set = True
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    self.device_map[self.TEST_SERIAL4] = test_dev4
-    serials = [
-        self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3,
-        self.TEST_SERIAL4
-    ]
-    mock_atft.atft_manager.FusePermAttr.side_effect = (
-        fastboot_exceptions.ProductNotSpecifiedException)
-    mock_atft._FusePermAttr(serials)
-    self.assertEqual(3, mock_atft._HandleException.call_count)
-    # Reset states
-    mock_atft._HandleException.reset_mock()
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.FUSEVBOOT_SUCCESS)
-    test_dev1.provision_state.bootloader_locked = True
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.REBOOT_SUCCESS)
-    test_dev2.provision_state.bootloader_locked = True
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEATTR_FAILED)
-    test_dev3.provision_state.bootloader_locked = True
-    test_dev4 = TestDeviceInfo(self.TEST_SERIAL4, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEATTR_SUCCESS)
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    self.device_map[self.TEST_SERIAL4] = test_dev4
-    mock_atft.atft_manager.FusePermAttr.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
-    mock_atft._FusePermAttr(serials)
-    self.assertEqual(3, mock_atft._HandleException.call_count)
+    mock_atft = self._CreateTargetOperationAtft()
+    for exception in (fastboot_exceptions.ProductNotSpecifiedException,
+                      FASTBOOT_FAILURE):
+      self.CreateDevices(self.fuse_attr_protos)
+      mock_atft._HandleException.reset_mock()
+      mock_atft.atft_manager.FusePermAttr.side_effect = exception
+      mock_atft._FusePermAttr(self.FOUR_SERIALS)
+      self.assertEqual(
+          3, mock_atft._HandleException.call_count, msg=repr(exception))
 
   # Test atft._LockAvb
   def testLockAvb(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_atft._SendMessageEvent = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.side_effect = (
-        self.MockGetTargetDevice)
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.FUSEATTR_SUCCESS)
-    test_dev1.provision_state.bootloader_locked = True
-    test_dev1.provision_state.avb_perm_attr_set = True
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.LOCKAVB_FAILED)
-    test_dev2.provision_state.bootloader_locked = True
-    test_dev2.provision_state.avb_perm_attr_set = True
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEATTR_FAILED)
-    test_dev3.provision_state.bootloader_locked = True
-    test_dev3.provision_state.avb_perm_attr_set = False
-    test_dev4 = TestDeviceInfo(self.TEST_SERIAL4, self.TEST_LOCATION2,
-                               ProvisionStatus.IDLE)
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    self.device_map[self.TEST_SERIAL4] = test_dev4
-    serials = [
-        self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3,
-        self.TEST_SERIAL4
-    ]
-    mock_atft._LockAvb(serials)
-    calls = [call(test_dev1), call(test_dev2)]
-    mock_atft.atft_manager.LockAvb.assert_has_calls(calls)
+    mock_atft = self._CreateTargetOperationAtft()
+    test_dev1, test_dev2, _, _ = self.CreateDevices(self.lock_avb_protos)
+    mock_atft._LockAvb(self.FOUR_SERIALS)
+    self.assertEqual(
+        [call(test_dev1), call(test_dev2)],
+        mock_atft.atft_manager.LockAvb.call_args_list)
 
   def testLockAvbExceptions(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_atft._SendMessageEvent = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.side_effect = (
-        self.MockGetTargetDevice)
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.FUSEATTR_SUCCESS)
-    test_dev1.provision_state.bootloader_locked = True
-    test_dev1.provision_state.avb_perm_attr_set = True
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.LOCKAVB_FAILED)
-    test_dev2.provision_state.bootloader_locked = True
-    test_dev2.provision_state.avb_perm_attr_set = True
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEATTR_FAILED)
-    test_dev3.provision_state.bootloader_locked = True
-    test_dev3.provision_state.avb_perm_attr_set = False
-    test_dev4 = TestDeviceInfo(self.TEST_SERIAL4, self.TEST_LOCATION2,
-                               ProvisionStatus.IDLE)
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    self.device_map[self.TEST_SERIAL4] = test_dev4
-    serials = [
-        self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3,
-        self.TEST_SERIAL4
-    ]
-    mock_atft.atft_manager.LockAvb.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
-    mock_atft._LockAvb(serials)
+    mock_atft = self._CreateTargetOperationAtft()
+    self.CreateDevices(self.lock_avb_protos)
+    mock_atft.atft_manager.LockAvb.side_effect = FASTBOOT_FAILURE
+    mock_atft._LockAvb(self.FOUR_SERIALS)
     self.assertEqual(2, mock_atft._HandleException.call_count)
 
   # Test atft._CheckLowKeyAlert
@@ -1595,19 +1288,16 @@ class AtftTest(TestCase):
     self.atfa_keys -= 1
     self.MockSetAttestUuid(target)
 
-  def MockFailedProvision(self, target, is_som_key=False):
+  @staticmethod
+  def MockFailedProvision(target, is_som_key=False):
     pass
 
   def testCheckLowKeyAlert(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._SendLowKeyAlertEvent = MagicMock()
-    dialog = MagicMock()
-    dialog.GetFirstWarning = MagicMock()
-    dialog.GetSecondWarning = MagicMock()
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
+    mock_atft.atft_manager = FakeAtftManager()
+    mock_atft._SendLowKeyAlertEvent = Mock()
+    dialog = Mock(spec=atft.ChangeThresholdDialog)
     dialog.GetFirstWarning.return_value = 101
     dialog.GetSecondWarning.return_value = 100
     mock_atft.change_threshold_dialog = dialog
@@ -1622,651 +1312,377 @@ class AtftTest(TestCase):
     # First check 101 left, no alert
     mock_atft.atft_manager.Provision.side_effect = self.MockSuccessProvision
     mock_atft._ProvisionTarget(test_dev1, False)
-    mock_atft._SendLowKeyAlertEvent.assert_not_called()
+    self.assertEqual(0, mock_atft._SendLowKeyAlertEvent.call_count)
     # Second provision failed
     # Second check, assume 100 left, verify, 101 left no alert
     mock_atft.atft_manager.Provision.side_effect = self.MockFailedProvision
     mock_atft._ProvisionTarget(test_dev1, False)
-    mock_atft._SendLowKeyAlertEvent.assert_not_called()
+    self.assertEqual(0, mock_atft._SendLowKeyAlertEvent.call_count)
     # Third check, assume 100 left, verify, 100 left, first warning
     mock_atft.atft_manager.Provision.side_effect = self.MockSuccessProvision
     mock_atft._ProvisionTarget(test_dev1, False)
-    mock_atft._SendLowKeyAlertEvent.assert_called_once()
+    self.assertEqual(1, mock_atft._SendLowKeyAlertEvent.call_count)
     self.assertEqual(True, mock_atft.first_key_alert_shown)
-    mock_atft._SendLowKeyAlertEvent.reset_mock()
+    mock_atft._SendLowKeyAlertEvent = Mock()
     # Fourth check, assume 99 left, verify, 99 left, second warning
     mock_atft._ProvisionTarget(test_dev1, False)
-    mock_atft._SendLowKeyAlertEvent.assert_called_once()
+    self.assertEqual(1, mock_atft._SendLowKeyAlertEvent.call_count)
     self.assertEqual(True, mock_atft.second_key_alert_shown)
-    mock_atft._SendLowKeyAlertEvent.reset_mock()
+    mock_atft._SendLowKeyAlertEvent = Mock()
     # Fifth check, no more warning, 98 left
     mock_atft._ProvisionTarget(test_dev1, False)
-    mock_atft._SendLowKeyAlertEvent.assert_not_called()
+    self.assertEqual(0, mock_atft._SendLowKeyAlertEvent.call_count)
 
   def testCheckLowKeyAlertException(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._SendLowKeyAlertEvent = MagicMock()
-    dialog = MagicMock()
-    dialog.GetFirstWarning = MagicMock()
-    dialog.GetSecondWarning = MagicMock()
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
+    mock_atft.atft_manager = FakeAtftManager()
+    dialog = Mock(spec=atft.ChangeThresholdDialog)
     dialog.GetFirstWarning.return_value = 101
     dialog.GetSecondWarning.return_value = 100
     mock_atft.change_threshold_dialog = dialog
     mock_atft.first_key_alert_shown = False
     mock_atft.second_key_alert_shown = False
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.UpdateATFAKeysLeft.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
-    mock_atft._CheckLowKeyAlert()
-    mock_atft._HandleException.assert_called_once()
-    mock_atft._HandleException.reset_mock()
-    mock_atft.atft_manager.UpdateATFAKeysLeft.side_effect = (
-        fastboot_exceptions.ProductNotSpecifiedException)
-    mock_atft._CheckLowKeyAlert()
-    mock_atft._HandleException.assert_called_once()
-    mock_atft._HandleException.reset_mock()
-    mock_atft.atft_manager.UpdateATFAKeysLeft.side_effect = (
-        fastboot_exceptions.DeviceNotFoundException)
-    mock_atft._CheckLowKeyAlert()
-    mock_atft._HandleException.assert_called_once()
+    for exception in (FASTBOOT_FAILURE,
+                      fastboot_exceptions.ProductNotSpecifiedException,
+                      fastboot_exceptions.DeviceNotFoundException):
+      mock_atft._HandleException = Mock()
+      mock_atft.atft_manager.UpdateATFAKeysLeft.side_effect = exception
+      mock_atft._CheckLowKeyAlert()
+      self.assertEqual(
+          1, mock_atft._HandleException.call_count, msg=repr(exception))
 
   # Test atft._Reboot
   def testReboot(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
     mock_atft._Reboot()
-    mock_atft.atft_manager.RebootATFA.assert_called_once()
+    self.assertEqual(1, mock_atft.atft_manager.RebootATFA.call_count)
 
   def testRebootExceptions(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.RebootATFA.side_effect = (
-        fastboot_exceptions.DeviceNotFoundException())
-    mock_atft._Reboot()
-    mock_atft._HandleException.assert_called_once()
-    mock_atft._HandleException.reset_mock()
-    mock_atft.atft_manager.RebootATFA.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
-    mock_atft._Reboot()
-    mock_atft._HandleException.assert_called_once()
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
+    for exception in (fastboot_exceptions.DeviceNotFoundException,
+                      FASTBOOT_FAILURE):
+      mock_atft._HandleException = Mock()
+      mock_atft.atft_manager.RebootATFA.side_effect = exception
+      mock_atft._Reboot()
+      self.assertEqual(
+          1, mock_atft._HandleException.call_count, msg=repr(exception))
 
   # Test atft._Shutdown
   def testShutdown(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
     mock_atft._Shutdown()
-    mock_atft.atft_manager.ShutdownATFA.assert_called_once()
+    self.assertEqual(1, mock_atft.atft_manager.ShutdownATFA.call_count)
 
   def testShutdownExceptions(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.ShutdownATFA.side_effect = (
-        fastboot_exceptions.DeviceNotFoundException())
-    mock_atft._Shutdown()
-    mock_atft._HandleException.assert_called_once()
-    mock_atft._HandleException.reset_mock()
-    mock_atft.atft_manager.ShutdownATFA.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
-    mock_atft._Shutdown()
-    mock_atft._HandleException.assert_called_once()
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
+    for exception in (fastboot_exceptions.DeviceNotFoundException,
+                      FASTBOOT_FAILURE):
+      mock_atft._HandleException = Mock()
+      mock_atft.atft_manager.ShutdownATFA.side_effect = exception
+      mock_atft._Shutdown()
+      self.assertEqual(
+          1, mock_atft._HandleException.call_count, msg=repr(exception))
 
-  def MockSetAttestUuid(self, target, is_som_key=False):
-    target.at_attest_uuid = self.TEST_ATTEST_UUID
+  @staticmethod
+  def MockSetAttestUuid(target, is_som_key=False):
+    target.at_attest_uuid = AtftTest.TEST_ATTEST_UUID
 
   # Test atft._ManualProvision
   def testManualProvision(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.Provision = MagicMock()
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
+    mock_atft._HandleException = Mock()
     mock_atft.atft_manager.Provision.side_effect = self.MockSetAttestUuid
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_atft._CheckLowKeyAlert = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.side_effect = (
-        self.MockGetTargetDevice)
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.PROVISION_FAILED)
-    test_dev1.provision_state.bootloader_locked = True
-    test_dev1.provision_state.avb_perm_attr_set = True
-    test_dev1.provision_state.avb_locked = True
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.LOCKAVB_SUCCESS)
-    test_dev2.provision_state.bootloader_locked = True
-    test_dev2.provision_state.avb_perm_attr_set = True
-    test_dev2.provision_state.avb_locked = True
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEATTR_FAILED)
-    test_dev3.provision_state.bootloader_locked = True
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    serials = [self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3]
-    mock_atft._GetSelectedSerials = MagicMock()
-    mock_atft._GetSelectedSerials.return_value = serials
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
+    mock_atft._CheckLowKeyAlert = Mock()
+    mock_atft.atft_manager.GetTargetDevice = self.device_map.get
+    test_dev1, test_dev2, _ = self.CreateDevices(
+        self.manual_provision_protos)
+    mock_atft._GetSelectedSerials = Mock()
+    mock_atft._GetSelectedSerials.return_value = self.THREE_SERIALS
+    mock_atft.atft_manager.GetATFADevice.return_value = Mock()
     # We are operating with product key.
-    mock_atft.atft_manager.product_info = MagicMock()
+    mock_atft.atft_manager.product_info = Mock()
     mock_atft.atft_manager.som_info = None
-    mock_atft.ShowWarning = MagicMock()
+    mock_atft.ShowWarning = Mock()
     mock_atft.ShowWarning.return_value = False
     mock_atft.OnManualProvision(None)
-    calls = [call(test_dev1, False), call(test_dev2, False)]
-    mock_atft.atft_manager.Provision.assert_has_calls(calls)
+    self.assertEqual(
+        [(test_dev1, False), (test_dev2, False)],
+        [c[0] for c in mock_atft.atft_manager.Provision.call_args_list])
 
     # Test som provision
-    mock_atft.atft_manager.Provision.reset_mock()
+    mock_atft.atft_manager.Provision = Mock(side_effect=self.MockSetAttestUuid)
     mock_atft.atft_manager.product_info = None
-    mock_atft.atft_manager.som_info = MagicMock
+    mock_atft.atft_manager.som_info = Mock()
     mock_atft.OnManualProvision(None)
-    calls = [call(test_dev1, True), call(test_dev2, True)]
+    self.assertEqual(
+        [(test_dev1, True), (test_dev2, True)],
+        [c[0] for c in mock_atft.atft_manager.Provision.call_args_list])
 
   def testManualProvisionReprovision(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.Provision = MagicMock()
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
+    mock_atft._HandleException = Mock()
     mock_atft.atft_manager.Provision.side_effect = self.MockSetAttestUuid
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_atft._CheckLowKeyAlert = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.side_effect = (
-        self.MockGetTargetDevice)
-
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.PROVISION_FAILED)
-    test_dev1.provision_state.bootloader_locked = True
-    test_dev1.provision_state.avb_perm_attr_set = True
-    test_dev1.provision_state.avb_locked = True
-
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.PROVISION_SUCCESS)
-    test_dev2.provision_state.bootloader_locked = True
-    test_dev2.provision_state.avb_perm_attr_set = True
-    test_dev2.provision_state.avb_locked = True
-    test_dev2.provision_state.product_provisioned = True
-
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.SOM_PROVISION_SUCCESS)
-    test_dev3.provision_state.bootloader_locked = True
-    test_dev3.provision_state.avb_perm_attr_set = True
-    test_dev3.provision_state.avb_locked = True
-    test_dev3.provision_state.som_provisioned = True
-
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-
+    mock_atft._CheckLowKeyAlert = Mock()
+    mock_atft.atft_manager.GetTargetDevice = self.device_map.get
+    test_dev1, test_dev2, test_dev3 = self.CreateDevices(
+        self.reprovision_protos)
     serials = [self.TEST_SERIAL1, self.TEST_SERIAL2]
-    mock_atft._GetSelectedSerials = MagicMock()
+    mock_atft._GetSelectedSerials = Mock()
     mock_atft._GetSelectedSerials.return_value = serials
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft.ShowWarning = MagicMock()
+    mock_atft.atft_manager.GetATFADevice.return_value = Mock()
+    mock_atft.ShowWarning = Mock()
     # We are operating with product key.
-    mock_atft.atft_manager.product_info = MagicMock()
+    mock_atft.atft_manager.product_info = Mock()
     mock_atft.atft_manager.som_info = None
 
     # User click No for reprovision.
     mock_atft.ShowWarning.return_value = False
     mock_atft.OnManualProvision(None)
     mock_atft.atft_manager.Provision.assert_called_once_with(test_dev1, False)
-    mock_atft.ShowWarning.assert_called_once()
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
 
     # User click yes.
-    mock_atft.ShowWarning.reset_mock()
-    mock_atft.atft_manager.Provision.reset_mock()
-    mock_atft.ShowWarning.return_value = True
+    mock_atft.ShowWarning = Mock(return_value=True)
+    mock_atft.atft_manager.Provision = Mock(side_effect=self.MockSetAttestUuid)
     mock_atft.OnManualProvision(None)
-    calls = [call(test_dev1, False), call(test_dev2, False)]
-    mock_atft.atft_manager.Provision.assert_has_calls(calls)
-    mock_atft.ShowWarning.assert_called_once()
+    self.assertEqual(
+        [(test_dev1, False), (test_dev2, False)],
+        [c[0] for c in mock_atft.atft_manager.Provision.call_args_list])
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
 
     # Now operating in som mode
-    mock_atft.ShowWarning.reset_mock()
-    mock_atft.atft_manager.Provision.reset_mock()
+    mock_atft.ShowWarning = Mock()
+    mock_atft.atft_manager.Provision = Mock(side_effect=self.MockSetAttestUuid)
     mock_atft.atft_manager.product_info = None
-    mock_atft.atft_manager.som_info = MagicMock()
+    mock_atft.atft_manager.som_info = Mock()
     mock_atft._GetSelectedSerials.return_value = [self.TEST_SERIAL3]
     # User click No for reprovision.
     mock_atft.ShowWarning.return_value = False
     mock_atft.OnManualProvision(None)
-    mock_atft.atft_manager.Provision.assert_not_called()
-    mock_atft.ShowWarning.assert_called_once()
+    self.assertEqual(0, mock_atft.atft_manager.Provision.call_count)
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
     # User click yes.
-    mock_atft.ShowWarning.reset_mock()
-    mock_atft.atft_manager.Provision.reset_mock()
-    mock_atft.ShowWarning.return_value = True
+    mock_atft.ShowWarning = Mock(return_value=True)
+    mock_atft.atft_manager.Provision = Mock(side_effect=self.MockSetAttestUuid)
     mock_atft.OnManualProvision(None)
-    mock_atft.atft_manager.Provision.assert_called_with(test_dev2, True)
-    mock_atft.ShowWarning.assert_called_once()
+    mock_atft.atft_manager.Provision.assert_called_with(test_dev3, True)
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
 
   def testManualProvisionExceptions(self):
-    mock_atft = MockAtft()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._SendStartMessageEvent = MagicMock()
-    mock_atft._SendSucceedMessageEvent = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft.atft_manager.Provision = MagicMock()
-    mock_atft.atft_manager.Provision.side_effect = self.MockSetAttestUuid
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_atft._CheckLowKeyAlert = MagicMock()
-    mock_atft.atft_manager.GetTargetDevice.side_effect = (
-        self.MockGetTargetDevice)
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.PROVISION_FAILED)
-    test_dev1.provision_state.bootloader_locked = True
-    test_dev1.provision_state.avb_perm_attr_set = True
-    test_dev1.provision_state.avb_locked = True
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.LOCKAVB_SUCCESS)
-    test_dev2.provision_state.bootloader_locked = True
-    test_dev2.provision_state.avb_perm_attr_set = True
-    test_dev2.provision_state.avb_locked = True
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEATTR_FAILED)
-    test_dev3.provision_state.bootloader_locked = True
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    serials = [self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3]
-    mock_atft._GetSelectedSerials = MagicMock()
-    mock_atft._GetSelectedSerials.return_value = serials
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft.ShowWarning = MagicMock()
-    mock_atft.atft_manager.Provision.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
-    mock_atft.OnManualProvision(None)
-    self.assertEqual(2, mock_atft._HandleException.call_count)
-    test_dev1 = TestDeviceInfo(self.TEST_SERIAL1, self.TEST_LOCATION1,
-                               ProvisionStatus.PROVISION_FAILED)
-    test_dev1.provision_state.bootloader_locked = True
-    test_dev1.provision_state.avb_perm_attr_set = True
-    test_dev1.provision_state.avb_locked = True
-    test_dev2 = TestDeviceInfo(self.TEST_SERIAL2, self.TEST_LOCATION2,
-                               ProvisionStatus.LOCKAVB_SUCCESS)
-    test_dev2.provision_state.bootloader_locked = True
-    test_dev2.provision_state.avb_perm_attr_set = True
-    test_dev2.provision_state.avb_locked = True
-    test_dev3 = TestDeviceInfo(self.TEST_SERIAL3, self.TEST_LOCATION2,
-                               ProvisionStatus.FUSEATTR_FAILED)
-    test_dev3.provision_state.bootloader_locked = True
-    self.device_map[self.TEST_SERIAL1] = test_dev1
-    self.device_map[self.TEST_SERIAL2] = test_dev2
-    self.device_map[self.TEST_SERIAL3] = test_dev3
-    serials = [self.TEST_SERIAL1, self.TEST_SERIAL2, self.TEST_SERIAL3]
-    mock_atft._GetSelectedSerials.return_value = serials
-    mock_atft._HandleException.reset_mock()
-    mock_atft.atft_manager.Provision.side_effect = (
-        fastboot_exceptions.DeviceNotFoundException())
-    mock_atft.OnManualProvision(None)
-    self.assertEqual(2, mock_atft._HandleException.call_count)
+    mock_atft = self.shared_atft.Copy()
+    self.SilenceEvents(mock_atft)
+    mock_atft._CheckLowKeyAlert = Mock()
+    mock_atft.atft_manager.GetTargetDevice = self.device_map.get
+    mock_atft._GetSelectedSerials = Mock()
+    mock_atft._GetSelectedSerials.return_value = self.THREE_SERIALS
+    mock_atft.atft_manager.GetATFADevice.return_value = Mock()
+    mock_atft.ShowWarning = Mock()
+    for exception in (FASTBOOT_FAILURE,
+                      fastboot_exceptions.DeviceNotFoundException):
+      self.CreateDevices(self.manual_provision_protos)
+      mock_atft._HandleException = Mock()
+      mock_atft.atft_manager.Provision.side_effect = exception
+      mock_atft.OnManualProvision(None)
+      self.assertEqual(
+          2, mock_atft._HandleException.call_count, msg=repr(exception))
+
+  def _CreateAtfaOperationAtft(self):
+    """Create a MockAtft for the tests of the ATFA device operations.
+
+    The MockAtft is a copy of shared_atft, see MockAtft.Copy. The event,
+    refresh and exception handling methods the operations call, listed in
+    ATFA_OPERATION_MOCKS, are replaced with mocks.
+    _SendAlertEvent, which no test checks, is replaced with NoOp. The ATFA
+    device is atft_manager.GetATFADevice.return_value.
+
+    Returns:
+      The MockAtft object.
+    """
+    mock_atft = self.shared_atft.Copy()
+    mock_atft.atft_manager.GetATFADevice.return_value = Mock()
+    mock_atft._SendAlertEvent = NoOp
+    for name in self.ATFA_OPERATION_MOCKS:
+      setattr(mock_atft, name, Mock())
+    return mock_atft
+
+  def _TestAtfaOperationFailure(self, run_operation, operation, device_call):
+    """Test that an ATFA operation handles each of ATFA_FAILURE_CASES.
+
+    The same MockAtft is used for all the cases, its mocks are reset before
+    each one.
+
+    Args:
+      run_operation: The function that runs the operation on a MockAtft.
+      operation: The name of the atft_manager method that fails.
+      device_call: The name of the ATFA device method that fails instead.
+    """
+    mock_atft = self._CreateAtfaOperationAtft()
+    operation_mock = getattr(mock_atft.atft_manager, operation)
+    device_mock = getattr(
+        mock_atft.atft_manager.GetATFADevice.return_value, device_call)
+    checked_mocks = (
+        mock_atft.PauseRefresh, mock_atft.ResumeRefresh,
+        mock_atft._HandleException, mock_atft._SendOperationStartEvent,
+        mock_atft._SendOperationSucceedEvent)
+    for exception, device_fails in self.ATFA_FAILURE_CASES:
+      for checked_mock in checked_mocks:
+        checked_mock.reset_mock()
+      operation_mock.side_effect = None if device_fails else exception
+      device_mock.side_effect = exception if device_fails else None
+
+      run_operation(mock_atft)
+
+      msg = '%r, %s fails: %s' % (exception, device_call, device_fails)
+      self.assertEqual(1, mock_atft.PauseRefresh.call_count, msg=msg)
+      self.assertEqual(1, mock_atft.ResumeRefresh.call_count, msg=msg)
+      self.assertEqual(1, mock_atft._HandleException.call_count, msg=msg)
+      self.assertEqual(
+          1, mock_atft._SendOperationStartEvent.call_count, msg=msg)
+      self.assertEqual(
+          0, mock_atft._SendOperationSucceedEvent.call_count, msg=msg)
 
   # Test atft._ProcessKey
   def testProcessKeySuccess(self):
-    mock_atft = MockAtft()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atfa = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = mock_atfa
-    mock_atft._UpdateKeysLeftInATFA = MagicMock()
-    mock_atft._SendOperationStartEvent = MagicMock()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_path = MagicMock()
+    mock_atft = self._CreateAtfaOperationAtft()
+    mock_atfa = mock_atft.atft_manager.GetATFADevice.return_value
+    mock_path = Mock()
 
     mock_atft._ProcessKey(mock_path)
     mock_atfa.Download.assert_called_once_with(mock_path)
-    mock_atft.atft_manager.ProcessATFAKey.assert_called_once()
-    mock_atft.PauseRefresh.assert_called_once()
-    mock_atft.ResumeRefresh.assert_called_once()
-    mock_atft._HandleException.assert_not_called()
+    self.assertEqual(1, mock_atft.atft_manager.ProcessATFAKey.call_count)
+    self.assertEqual(1, mock_atft.PauseRefresh.call_count)
+    self.assertEqual(1, mock_atft.ResumeRefresh.call_count)
+    self.assertEqual(0, mock_atft._HandleException.call_count)
 
-    mock_atft._SendOperationStartEvent.assert_called_once()
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
-    mock_atft._UpdateKeysLeftInATFA.assert_called_once()
+    self.assertEqual(1, mock_atft._SendOperationStartEvent.call_count)
+    self.assertEqual(1, mock_atft._SendOperationSucceedEvent.call_count)
+    self.assertEqual(1, mock_atft._UpdateKeysLeftInATFA.call_count)
 
   def testProcessKeyFailure(self):
-    self.TestProcessKeyFailureCommon(
-        fastboot_exceptions.FastbootFailure(''))
-    self.TestProcessKeyFailureCommon(
-        fastboot_exceptions.DeviceNotFoundException)
-    self.TestProcessKeyFailureCommon(
-        fastboot_exceptions.FastbootFailure(''), True)
-    self.TestProcessKeyFailureCommon(
-        fastboot_exceptions.DeviceNotFoundException, True)
-
-  def TestProcessKeyFailureCommon(self, exception, failure_download=False):
-    mock_atft = MockAtft()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft._UpdateKeysLeftInATFA = MagicMock()
-    mock_atft._SendOperationStartEvent = MagicMock()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_path = MagicMock()
-    if not failure_download:
-      mock_atft.atft_manager.ProcessATFAKey = MagicMock()
-      mock_atft.atft_manager.ProcessATFAKey.side_effect = exception
-    else:
-      mock_atft.atft_manager.GetATFADevice = MagicMock()
-      mock_atft.atft_manager.GetATFADevice.return_value.Download = MagicMock()
-      mock_atft.atft_manager.GetATFADevice = MagicMock()
-      mock_atft.atft_manager.GetATFADevice.return_value.Download.side_effect = exception
-
-    mock_atft._ProcessKey(mock_path)
-    mock_atft.PauseRefresh.assert_called_once()
-    mock_atft.ResumeRefresh.assert_called_once()
-    mock_atft._HandleException.assert_called_once()
-
-    mock_atft._SendOperationStartEvent.assert_called_once()
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
+    self._TestAtfaOperationFailure(
+        lambda mock_atft: mock_atft._ProcessKey(Mock()), 'ProcessATFAKey',
+        'Download')
 
   # Test atft._UpdateATFA
   def testUpdateATFASuccess(self):
-    mock_atft = MockAtft()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atfa = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = mock_atfa
-    mock_atft._UpdateKeysLeftInATFA = MagicMock()
-    mock_atft._SendOperationStartEvent = MagicMock()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_path = MagicMock()
+    mock_atft = self._CreateAtfaOperationAtft()
+    mock_atfa = mock_atft.atft_manager.GetATFADevice.return_value
+    mock_path = Mock()
 
     mock_atft._UpdateATFA(mock_path)
     mock_atfa.Download.assert_called_once_with(mock_path)
-    mock_atft.atft_manager.UpdateATFA.assert_called_once()
-    mock_atft.PauseRefresh.assert_called_once()
-    mock_atft.ResumeRefresh.assert_called_once()
-    mock_atft._HandleException.assert_not_called()
+    self.assertEqual(1, mock_atft.atft_manager.UpdateATFA.call_count)
+    self.assertEqual(1, mock_atft.PauseRefresh.call_count)
+    self.assertEqual(1, mock_atft.ResumeRefresh.call_count)
+    self.assertEqual(0, mock_atft._HandleException.call_count)
 
-    mock_atft._SendOperationStartEvent.assert_called_once()
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
+    self.assertEqual(1, mock_atft._SendOperationStartEvent.call_count)
+    self.assertEqual(1, mock_atft._SendOperationSucceedEvent.call_count)
 
   def testUpdateATFAFailure(self):
-    self.TestUpdateATFAFailureCommon(
-        fastboot_exceptions.FastbootFailure(''))
-    self.TestUpdateATFAFailureCommon(
-        fastboot_exceptions.DeviceNotFoundException)
-    self.TestUpdateATFAFailureCommon(
-        fastboot_exceptions.FastbootFailure(''), True)
-    self.TestUpdateATFAFailureCommon(
-        fastboot_exceptions.DeviceNotFoundException, True)
-
-  def TestUpdateATFAFailureCommon(self, exception, failure_download=False):
-    mock_atft = MockAtft()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft._UpdateKeysLeftInATFA = MagicMock()
-    mock_atft._SendOperationStartEvent = MagicMock()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    mock_path = MagicMock()
-    if not failure_download:
-      mock_atft.atft_manager.UpdateATFA = MagicMock()
-      mock_atft.atft_manager.UpdateATFA.side_effect = exception
-    else:
-      mock_atft.atft_manager.GetATFADevice = MagicMock()
-      mock_atft.atft_manager.GetATFADevice.return_value.Download = MagicMock()
-      mock_atft.atft_manager.GetATFADevice = MagicMock()
-      mock_atft.atft_manager.GetATFADevice.return_value.Download.side_effect = exception
-
-    mock_atft._UpdateATFA(mock_path)
-    mock_atft.PauseRefresh.assert_called_once()
-    mock_atft.ResumeRefresh.assert_called_once()
-    mock_atft._HandleException.assert_called_once()
-
-    mock_atft._SendOperationStartEvent.assert_called_once()
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
+    self._TestAtfaOperationFailure(
+        lambda mock_atft: mock_atft._UpdateATFA(Mock()), 'UpdateATFA',
+        'Download')
 
   # Test atft._PurgeKey
   def testPurgeKey(self):
-    mock_atft = MockAtft()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft._UpdateKeysLeftInATFA = MagicMock()
-    mock_atft._SendOperationStartEvent = MagicMock()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
+    mock_atft = self._CreateAtfaOperationAtft()
 
     mock_atft._PurgeKey()
-    mock_atft.atft_manager.PurgeATFAKey.assert_called_once()
-    mock_atft.PauseRefresh.assert_called_once()
-    mock_atft.ResumeRefresh.assert_called_once()
-    mock_atft._HandleException.assert_not_called()
-    mock_atft._SendOperationStartEvent.assert_called_once()
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
-
-    # FastbootFailure
-    mock_atft._HandleException.reset_mock()
-    mock_atft._SendOperationSucceedEvent.reset_mock()
-    mock_atft.atft_manager.PurgeATFAKey = MagicMock()
-    mock_atft.atft_manager.PurgeATFAKey.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
-    mock_atft._PurgeKey()
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
-    mock_atft._HandleException.assert_called_once()
-
-    # DeviceNotFoundException
-    mock_atft._HandleException.reset_mock()
-    mock_atft._SendOperationSucceedEvent.reset_mock()
-    mock_atft.atft_manager.PurgeATFAKey = MagicMock()
-    mock_atft.atft_manager.PurgeATFAKey.side_effect = (
-        fastboot_exceptions.DeviceNotFoundException)
-    mock_atft._PurgeKey()
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
-    mock_atft._HandleException.assert_called_once()
-
-    # ProductNotSpecifiedException
-    mock_atft._HandleException.reset_mock()
-    mock_atft._SendOperationSucceedEvent.reset_mock()
-    mock_atft.atft_manager.PurgeATFAKey = MagicMock()
-    mock_atft.atft_manager.PurgeATFAKey.side_effect = (
-        fastboot_exceptions.ProductNotSpecifiedException)
-    mock_atft._PurgeKey()
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
-    mock_atft._HandleException.assert_called_once()
+    self.assertEqual(1, mock_atft.atft_manager.PurgeATFAKey.call_count)
+    self.assertEqual(1, mock_atft.PauseRefresh.call_count)
+    self.assertEqual(1, mock_atft.ResumeRefresh.call_count)
+    self.assertEqual(0, mock_atft._HandleException.call_count)
+    self.assertEqual(1, mock_atft._SendOperationStartEvent.call_count)
+    self.assertEqual(1, mock_atft._SendOperationSucceedEvent.call_count)
+
+    for exception in (FASTBOOT_FAILURE,
+                      fastboot_exceptions.DeviceNotFoundException,
+                      fastboot_exceptions.ProductNotSpecifiedException):
+      mock_atft._HandleException.reset_mock()
+      mock_atft._SendOperationSucceedEvent.reset_mock()
+      mock_atft.atft_manager.PurgeATFAKey.side_effect = exception
+      mock_atft._PurgeKey()
+      msg = repr(exception)
+      self.assertEqual(
+          0, mock_atft._SendOperationSucceedEvent.call_count, msg=msg)
+      self.assertEqual(1, mock_atft._HandleException.call_count, msg=msg)
 
   # Test atft._GetRegFile
   def testGetRegFile(self):
-    mock_atft = MockAtft()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atfa = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = mock_atfa
-    mock_atft._UpdateKeysLeftInATFA = MagicMock()
-    mock_atft._SendOperationStartEvent = MagicMock()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
+    mock_atft = self._CreateAtfaOperationAtft()
+    mock_atfa = mock_atft.atft_manager.GetATFADevice.return_value
 
     mock_atft._GetRegFile(self.TEST_TEXT)
     mock_atfa.Upload.assert_called_once_with(self.TEST_TEXT)
     mock_atft.atft_manager.PrepareFile.assert_called_once_with('reg')
-    mock_atft.PauseRefresh.assert_called_once()
-    mock_atft.ResumeRefresh.assert_called_once()
-    mock_atft._HandleException.assert_not_called()
-    mock_atft._SendOperationStartEvent.assert_called_once()
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
+    self.assertEqual(1, mock_atft.PauseRefresh.call_count)
+    self.assertEqual(1, mock_atft.ResumeRefresh.call_count)
+    self.assertEqual(0, mock_atft._HandleException.call_count)
+    self.assertEqual(1, mock_atft._SendOperationStartEvent.call_count)
+    self.assertEqual(1, mock_atft._SendOperationSucceedEvent.call_count)
     self.assertEqual(True, os.path.exists(self.TEST_TEXT))
     os.remove(self.TEST_TEXT)
 
   def testGetRegFileFailure(self):
-    self.TestGetRegFileFailureCommon(
-        fastboot_exceptions.FastbootFailure(''))
-    self.TestGetRegFileFailureCommon(
-        fastboot_exceptions.DeviceNotFoundException)
-    self.TestGetRegFileFailureCommon(
-        fastboot_exceptions.FastbootFailure(''), True)
-    self.TestGetRegFileFailureCommon(
-        fastboot_exceptions.DeviceNotFoundException, True)
-
-  def TestGetRegFileFailureCommon(self, exception, upload_fail=False):
-    mock_atft = MockAtft()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft._UpdateKeysLeftInATFA = MagicMock()
-    mock_atft._SendOperationStartEvent = MagicMock()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    if not upload_fail:
-      mock_atft.atft_manager.PrepareFile.side_effect = exception
-    else:
-      mock_atft.atft_manager.GetATFADevice = MagicMock()
-      (mock_atft.atft_manager.GetATFADevice.return_value.Upload.
-       side_effect) = exception
-
     # This invalid path would cause an IOError while creating file.
-    mock_atft._GetRegFile('/123/123')
-
-    mock_atft.PauseRefresh.assert_called_once()
-    mock_atft.ResumeRefresh.assert_called_once()
-    mock_atft._HandleException.assert_called_once()
-    mock_atft._SendOperationStartEvent.assert_called_once()
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
+    self._TestAtfaOperationFailure(
+        lambda mock_atft: mock_atft._GetRegFile('/123/123'), 'PrepareFile',
+        'Upload')
 
   # Test atft._GetAuditFile
   def testGetAuditFile(self):
-    mock_atft = MockAtft()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atfa = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = mock_atfa
-    mock_atft._UpdateKeysLeftInATFA = MagicMock()
-    mock_atft._SendOperationStartEvent = MagicMock()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
+    mock_atft = self._CreateAtfaOperationAtft()
+    mock_atfa = mock_atft.atft_manager.GetATFADevice.return_value
 
     mock_atft._GetAuditFile(self.TEST_TEXT)
     mock_atfa.Upload.assert_called_once_with(self.TEST_TEXT)
     mock_atft.atft_manager.PrepareFile.assert_called_once_with('audit')
-    mock_atft.PauseRefresh.assert_called_once()
-    mock_atft.ResumeRefresh.assert_called_once()
-    mock_atft._HandleException.assert_not_called()
-    mock_atft._SendOperationStartEvent.assert_called_once()
-    mock_atft._SendOperationSucceedEvent.assert_called_once()
+    self.assertEqual(1, mock_atft.PauseRefresh.call_count)
+    self.assertEqual(1, mock_atft.ResumeRefresh.call_count)
+    self.assertEqual(0, mock_atft._HandleException.call_count)
+    self.assertEqual(1, mock_atft._SendOperationStartEvent.call_count)
+    self.assertEqual(1, mock_atft._SendOperationSucceedEvent.call_count)
     self.assertEqual(True, os.path.exists(self.TEST_TEXT))
     os.remove(self.TEST_TEXT)
 
   def testGetAuditFileFailure(self):
-    self.TestGetAuditFileFailureCommon(
-        fastboot_exceptions.FastbootFailure(''))
-    self.TestGetAuditFileFailureCommon(
-        fastboot_exceptions.DeviceNotFoundException)
-    self.TestGetAuditFileFailureCommon(
-        fastboot_exceptions.FastbootFailure(''), True)
-    self.TestGetAuditFileFailureCommon(
-        fastboot_exceptions.DeviceNotFoundException, True)
-
-  def TestGetAuditFileFailureCommon(self, exception, upload_fail=False):
-    mock_atft = MockAtft()
-    mock_atft.atft_manager = MagicMock()
-    mock_atft.atft_manager.GetATFADevice = MagicMock()
-    mock_atft.atft_manager.GetATFADevice.return_value = MagicMock()
-    mock_atft._UpdateKeysLeftInATFA = MagicMock()
-    mock_atft._SendOperationStartEvent = MagicMock()
-    mock_atft._SendOperationSucceedEvent = MagicMock()
-    mock_atft.PauseRefresh = MagicMock()
-    mock_atft.ResumeRefresh = MagicMock()
-    mock_atft._HandleException = MagicMock()
-    mock_atft._SendAlertEvent = MagicMock()
-    if not upload_fail:
-      mock_atft.atft_manager.PrepareFile.side_effect = exception
-    else:
-      mock_atft.atft_manager.GetATFADevice = MagicMock()
-      (mock_atft.atft_manager.GetATFADevice.return_value.Upload.
-       side_effect) = exception
-
     # This invalid path would cause an IOError while creating file.
-    mock_atft._GetAuditFile('/123/123')
-
-    mock_atft.PauseRefresh.assert_called_once()
-    mock_atft.ResumeRefresh.assert_called_once()
-    mock_atft._HandleException.assert_called_once()
-    mock_atft._SendOperationStartEvent.assert_called_once()
-    mock_atft._SendOperationSucceedEvent.assert_not_called()
-
+    self._TestAtfaOperationFailure(
+        lambda mock_atft: mock_atft._GetAuditFile('/123/123'), 'PrepareFile',
+        'Upload')
 
-  @patch('atft.AtftLog.Info', MagicMock())
-  @patch('atft.AtftLog._CreateLogFile')
-  def testAtftLogCreate(self, mock_createfile):
+  @patch.multiple('atft.AtftLog', Info=Mock(), _CreateLogFile=DEFAULT)
+  def testAtftLogCreateDirNotExists(self, _CreateLogFile):
     # Test AtftLog.Initialize(), log dir does not exist, create it.
     log_dir = self.LOG_DIR
     log_size = 10
     log_file_number = 1
     atft_log = atft.AtftLog(log_dir, log_size, log_file_number)
-    mock_createfile.assert_called_once()
-    self.assertEqual(os.path.exists(log_dir))
+    self.assertEqual(1, _CreateLogFile.call_count)
+    self.assertTrue(os.path.exists(log_dir))
     shutil.rmtree(log_dir)
 
-  @patch('atft.AtftLog.Info', MagicMock())
-  @patch('atft.AtftLog._CreateLogFile')
-  def testAtftLogCreateDirExists(self, mock_createfile):
+  @patch.multiple('atft.AtftLog', Info=Mock(), _CreateLogFile=DEFAULT)
+  def testAtftLogCreateDirExists(self, _CreateLogFile):
     # Log directory exists, should check for existing log files.
     log_dir = self.LOG_DIR
     self.fs.create_dir(log_dir)
-    self.fs.create_file(os.path.join(log_dir, 'atft_log_1'))
-    self.fs.create_file(os.path.join(log_dir, 'atft_log_2'))
-    log_size = 10
+    self.fs.create_file(self.log_files[1])
+    self.fs.create_file(self.log_files[2])
     log_size = 10
     log_file_number = 1
     atft_log = atft.AtftLog(log_dir, log_size, log_file_number)
     # Create the first log file.
-    mock_createfile.assert_not_called()
-    self.assertEqual(atft_log.log_dir_file, os.path.join(
-        self.LOG_DIR, 'atft_log_2'))
+    self.assertEqual(0, _CreateLogFile.call_count)
+    self.assertEqual(atft_log.log_dir_file, self.log_files[2])
     shutil.rmtree(log_dir)
 
   @patch('atft.AtftLog.Initialize', MagicMock())
@@ -2281,7 +1697,7 @@ class AtftTest(TestCase):
     atft_log._GetCurrentTimestamp = mock_get_time
     mock_get_time.return_value = self.TEST_TIMESTAMP
     atft_log._CreateLogFile()
-    mock_get_time.assert_called_once()
+    self.assertEqual(1, mock_get_time.call_count)
     log_file_path = os.path.join(
         log_dir, 'atft_log_' + str(self.TEST_TIMESTAMP))
     self.assertEqual(log_file_path, atft_log.log_dir_file)
@@ -2289,12 +1705,6 @@ class AtftTest(TestCase):
     shutil.rmtree(log_dir)
 
   # Test AtftLog._LimitSize()
-  def MockListDir(self, dir):
-    return self.files
-
-  def MockCreateFile(self, add_file):
-    self.files.append(add_file)
-
   @patch('atft.AtftLog.Initialize', MagicMock())
   def testLimitSize(self):
     log_dir = self.LOG_DIR
@@ -2302,9 +1712,9 @@ class AtftTest(TestCase):
     log_size = 20
     log_file_number = 2
     self.fs.create_dir(log_dir)
-    log_file1 = os.path.join(log_dir, 'atft_log_1')
-    log_file2 = os.path.join(log_dir, 'atft_log_2')
-    log_file3 = os.path.join(log_dir, 'atft_log_3')
+    log_file1 = self.log_files[1]
+    log_file2 = self.log_files[2]
+    log_file3 = self.log_files[3]
     self.fs.create_file(log_file1, contents='abcde')
     self.fs.create_file(log_file2, contents='abcde')
     atft_log = atft.AtftLog(log_dir, log_size, log_file_number)
@@ -2322,59 +1732,73 @@ class AtftTest(TestCase):
     shutil.rmtree(log_dir)
 
   # Test ChangeThresholdDialog.OnSave()
+  def CreateChangeThresholdDialog(self):
+    """Create a ChangeThresholdDialog with mock inputs.
+
+    Returns:
+      The ChangeThresholdDialog object. The tests set its warnings and the
+      return values of its input mocks before each OnSave.
+    """
+    test_dialog = atft.ChangeThresholdDialog(IGNORED, 2, None)
+    test_dialog.first_warning_input = Mock(spec=wx.TextCtrl)
+    test_dialog.second_warning_input = Mock(spec=wx.TextCtrl)
+    return test_dialog
+
   def testChangeThresholdDialogSaveNormal(self):
-    self.TestChangeThresholdDialogSaveNormalEach('10', '5')
-    self.TestChangeThresholdDialogSaveNormalEach('10', '')
-    self.TestChangeThresholdDialogSaveNormalEach('', '')
-
-  def TestChangeThresholdDialogSaveNormalEach(self, value1, value2):
-    test_dialog = atft.ChangeThresholdDialog(MagicMock(), 2, 0)
-    test_dialog.EndModal = MagicMock()
-    test_dialog.first_warning_input = MagicMock()
-    test_dialog.first_warning_input.GetValue.return_value = value1
-    test_dialog.second_warning_input = MagicMock()
-    test_dialog.second_warning_input.GetValue.return_value = value2
-    test_dialog.OnSave(None)
-    test_dialog.EndModal.assert_called_once()
-    if value1:
-      self.assertEqual(int(value1), test_dialog.GetFirstWarning())
-    if value2:
-      self.assertEqual(int(value2), test_dialog.GetSecondWarning())
+    test_dialog = self.CreateChangeThresholdDialog()
+    for value1, value2 in (('10', '5'), ('10', ''), ('', '')):
+      msg = '%r, %r' % (value1, value2)
+      test_dialog.first_warning = 2
+      test_dialog.second_warning = 0
+      test_dialog.EndModal = Mock()
+      test_dialog.first_warning_input.GetValue.return_value = value1
+      test_dialog.second_warning_input.GetValue.return_value = value2
+      test_dialog.OnSave(None)
+      self.assertEqual(1, test_dialog.EndModal.call_count, msg=msg)
+      if value1:
+        self.assertEqual(int(value1), test_dialog.GetFirstWarning(), msg=msg)
+      if value2:
+        self.assertEqual(int(value2), test_dialog.GetSecondWarning(), msg=msg)
 
   def testChangeThresholdDialogSaveInvalid(self):
-    # Invalid format
-    self.TestChangeThresholdDialogSaveInvalidEach('a', '5')
-    self.TestChangeThresholdDialogSaveInvalidEach('5', 'a')
-    self.TestChangeThresholdDialogSaveInvalidEach('a', 'b')
-    # Second < First
-    self.TestChangeThresholdDialogSaveInvalidEach('4', '5')
-    # Invalid format
-    self.TestChangeThresholdDialogSaveInvalidEach('a', '')
-    # Only second, not first
-    self.TestChangeThresholdDialogSaveInvalidEach('', '5')
-    # Negative value
-    self.TestChangeThresholdDialogSaveInvalidEach('-2', '')
-    self.TestChangeThresholdDialogSaveInvalidEach('5', '-2')
-
-  def TestChangeThresholdDialogSaveInvalidEach(self, value1, value2):
-    test_dialog = atft.ChangeThresholdDialog(MagicMock(), 2, None)
-    test_dialog.EndModal = MagicMock()
-    test_dialog.first_warning_input = MagicMock()
-    test_dialog.first_warning_input.GetValue.return_value = value1
-    test_dialog.second_warning_input = MagicMock()
-    test_dialog.second_warning_input.GetValue.return_value = value2
-    test_dialog.OnSave(None)
-    test_dialog.EndModal.assert_not_called()
-    self.assertEqual(2, test_dialog.GetFirstWarning())
-    self.assertEqual(None, test_dialog.GetSecondWarning())
+    test_dialog = self.CreateChangeThresholdDialog()
+    for value1, value2 in (
+        # Invalid format
+        ('a', '5'), ('5', 'a'), ('a', 'b'),
+        # Second < First
+        ('4', '5'),
+        # Invalid format
+        ('a', ''),
+        # Only second, not first
+        ('', '5'),
+        # Negative value
+        ('-2', ''), ('5', '-2')):
+      msg = '%r, %r' % (value1, value2)
+      test_dialog.first_warning = 2
+      test_dialog.second_warning = None
+      test_dialog.EndModal = Mock()
+      test_dialog.first_warning_input.GetValue.return_value = value1
+      test_dialog.second_warning_input.GetValue.return_value = value2
+      test_dialog.OnSave(None)
+      self.assertEqual(0, test_dialog.EndModal.call_count, msg=msg)
+      self.assertEqual(2, test_dialog.GetFirstWarning(), msg=msg)
+      self.assertEqual(None, test_dialog.GetSecondWarning(), msg=msg)
 
   # Test AppSettingsDialog.OnSaveSetting
-  def testSavePasswordSetting(self):
-    mock_atft = MockAtft()
+  def CreatePasswordDialog(self, mock_atft, old_password, new_password):
+    """Create an AppSettingsDialog showing the password setting.
+
+    Args:
+      mock_atft: The MockAtft object whose ChangePassword handles the change.
+      old_password: The password typed in the original password input.
+      new_password: The password typed in the new password input.
+    Returns:
+      The AppSettingsDialog object.
+    """
     test_password_dialog = atft.AppSettingsDialog(
-        MagicMock(), MagicMock(), MagicMock(), MagicMock(), MagicMock(),
-        mock_atft.ChangePassword, 0, MagicMock())
-    test_password_dialog.EndModal = MagicMock()
+        IGNORED, IGNORED, IGNORED, IGNORED, IGNORED, mock_atft.ChangePassword,
+        0, IGNORED)
+    test_password_dialog.EndModal = Mock()
     test_password_dialog.ShowCurrentSetting = MagicMock()
     test_password_dialog.password_setting = MagicMock()
     test_password_dialog.language_setting = MagicMock()
@@ -2383,68 +1807,53 @@ class AtftTest(TestCase):
     test_password_dialog.button_map = MagicMock()
     test_password_dialog.button_unmap = MagicMock()
     test_password_dialog.buttons_sizer = MagicMock()
-    old_password = self.TEST_PASSWORD1
-    new_password = self.TEST_PASSWORD2
-    mock_atft.password_hash = mock_atft.GeneratePasswordHash(old_password)
     test_password_dialog.ShowPasswordSetting(None)
-    test_password_dialog.original_password_input = MagicMock()
+    test_password_dialog.original_password_input = Mock(spec=wx.TextCtrl)
     test_password_dialog.original_password_input.GetValue.return_value = (
         old_password)
-    test_password_dialog.original_password_input.SetValue = MagicMock()
-    test_password_dialog.new_password_input = MagicMock()
+    test_password_dialog.new_password_input = Mock(spec=wx.TextCtrl)
     test_password_dialog.new_password_input.GetValue.return_value = (
         new_password)
-    test_password_dialog.new_password_input.SetValue = MagicMock()
+    return test_password_dialog
+
+  def testSavePasswordSetting(self):
+    mock_atft = self.shared_atft.Copy()
+    old_password = self.TEST_PASSWORD1
+    new_password = self.TEST_PASSWORD2
+    mock_atft.password_hash = self.password_hash1
+    test_password_dialog = self.CreatePasswordDialog(
+        mock_atft, old_password, new_password)
     test_password_dialog.OnSaveSetting(None)
     (test_password_dialog.original_password_input
      .SetValue.assert_called_once_with(''))
     test_password_dialog.new_password_input.SetValue.assert_called_once_with('')
-    test_password_dialog.EndModal.assert_called_once()
+    self.assertEqual(1, test_password_dialog.EndModal.call_count)
     self.assertEqual(True, atft.Atft.VerifyPassword(
         new_password, mock_atft.password_hash))
 
   def testSavePasswordSettingPasswordIncorrect(self):
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft._SendAlertEvent = MagicMock()
     mock_atft._HandleException = MagicMock()
-    test_password_dialog = atft.AppSettingsDialog(
-        MagicMock(), MagicMock(), MagicMock(), MagicMock(), MagicMock(),
-        mock_atft.ChangePassword, 0, MagicMock())
-    test_password_dialog.EndModal = MagicMock()
-    test_password_dialog.ShowCurrentSetting = MagicMock()
-    test_password_dialog.password_setting = MagicMock()
-    test_password_dialog.language_setting = MagicMock()
-    test_password_dialog.menu_set_password = MagicMock()
-    test_password_dialog.button_save = MagicMock()
-    test_password_dialog.button_map = MagicMock()
-    test_password_dialog.button_unmap = MagicMock()
-    test_password_dialog.buttons_sizer = MagicMock()
     old_password = self.TEST_PASSWORD1
     new_password = self.TEST_PASSWORD2
-    mock_atft.password_hash = mock_atft.GeneratePasswordHash(old_password)
-    test_password_dialog.ShowPasswordSetting(None)
-    test_password_dialog.original_password_input = MagicMock()
-    test_password_dialog.original_password_input.GetValue.return_value = (
-        new_password)
-    test_password_dialog.original_password_input.SetValue = MagicMock()
-    test_password_dialog.new_password_input = MagicMock()
-    test_password_dialog.new_password_input.GetValue.return_value = (
-        new_password)
-    test_password_dialog.new_password_input.SetValue = MagicMock()
+    mock_atft.password_hash = self.password_hash1
+    test_password_dialog = self.CreatePasswordDialog(
+        mock_atft, new_password, new_password)
     test_password_dialog.OnSaveSetting(None)
     test_password_dialog.original_password_input.SetValue.assert_called_with('')
-    test_password_dialog.EndModal.assert_not_called()
+    self.assertEqual(0, test_password_dialog.EndModal.call_count)
     self.assertEqual(
         True, atft.Atft.VerifyPassword(old_password, mock_atft.password_hash))
     self.assertEqual(
         False, atft.Atft.VerifyPassword(new_password, mock_atft.password_hash))
-    mock_atft._HandleException.assert_called_once()
-    mock_atft._SendAlertEvent.assert_called_once()
+    self.assertEqual(1, mock_atft._HandleException.call_count)
+    self.assertEqual(1, mock_atft._SendAlertEvent.call_count)
 
   # Test _SaveFileEventHandler
   @patch('wx.DirDialog')
   def testSaveFileEvent(self, mock_create_dialog):
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     message = self.TEST_TEXT
     filename = self.TEST_FILENAME
     callback = MagicMock()
@@ -2460,12 +1869,12 @@ class AtftTest(TestCase):
     event = MagicMock()
     event.GetValue.return_value = data
     mock_atft._SaveFileEventHandler(event)
-    callback.assert_called_once()
+    self.assertEqual(1, callback.call_count)
 
   @patch('wx.DirDialog')
   def testSaveFileEventFileExists(
       self, mock_create_dialog):
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft.ShowWarning = MagicMock()
     mock_atft.ShowWarning.return_value = True
     message = self.TEST_TEXT
@@ -2485,195 +1894,135 @@ class AtftTest(TestCase):
     event = MagicMock()
     event.GetValue.return_value = data
     mock_atft._SaveFileEventHandler(event)
-    mock_atft.ShowWarning.assert_called_once()
-    callback.assert_called_once()
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
+    self.assertEqual(1, callback.call_count)
 
     # If use clicks no to the warning.
     callback.reset_mock()
     mock_atft.ShowWarning.return_value = False
     mock_atft._SaveFileEventHandler(event)
-    callback.assert_not_called()
+    self.assertEqual(0, callback.call_count)
 
     # Clean the fake fs state.
     os.remove(os.path.join(self.TEST_TEXT, self.TEST_FILENAME))
 
   def testCheckProvisionStepsSuccess(self):
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft._SendAlertEvent = MagicMock()
     mock_atft.provision_steps = []
     mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_not_called()
-    self.assertEqual(
+    self.assertEqual(0, mock_atft._SendAlertEvent.call_count)
+    self.assertIs(
         mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
 
     # Test [step1], [step1, step2], [step1, step2, step3] ...
-    for i in range(1, len(mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT)):
-      provision_steps = []
-      for j in range(i):
-        provision_steps.append(mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT[j])
+    default_steps = mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT
+    for i in range(1, len(default_steps)):
+      provision_steps = default_steps[:i]
       mock_atft.provision_steps = provision_steps
       mock_atft._CheckProvisionSteps()
-      mock_atft._SendAlertEvent.assert_not_called()
       self.assertEqual(
-          provision_steps, mock_atft.provision_steps)
+          0, mock_atft._SendAlertEvent.call_count, msg=provision_steps)
+      self.assertEqual(
+          provision_steps, mock_atft.provision_steps, msg=provision_steps)
 
   def testCheckProvisionStepsInvalidSyntax(self):
-    mock_atft = MockAtft()
-    mock_atft._SendAlertEvent = MagicMock()
-    # Test invalid format (not array).
-    mock_atft.provision_steps = '1234'
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft._SendAlertEvent.reset_mock()
-    self.assertEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Test invalid operation.
-    mock_atft.provision_steps = ['1234']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft._SendAlertEvent.reset_mock()
-    self.assertEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Even if test_mode is true, syntax error is still failure.
-    mock_atft.test_mode = True
-    mock_atft.provision_steps = '1234'
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft._SendAlertEvent.reset_mock()
-    self.assertEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    mock_atft.provision_steps = ['1234']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft._SendAlertEvent.reset_mock()
-    self.assertEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
+    mock_atft = self.shared_atft.Copy()
+    # Test invalid format (not array) and invalid operation. Even if test_mode
+    # is true, syntax error is still failure.
+    for test_mode in (False, True):
+      for provision_steps in ('1234', ['1234']):
+        msg = '%r, test_mode: %s' % (provision_steps, test_mode)
+        mock_atft._SendAlertEvent = MagicMock()
+        mock_atft.test_mode = test_mode
+        mock_atft.provision_steps = provision_steps
+        mock_atft._CheckProvisionSteps()
+        self.assertEqual(1, mock_atft._SendAlertEvent.call_count, msg=msg)
+        self.assertIs(
+            mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT,
+            mock_atft.provision_steps, msg=msg)
 
   def testCheckProvisionStepsSecurityReq(self):
     # Test cases when the provision steps do not meet security requirement.
-    mock_atft = MockAtft()
-    mock_atft._SendAlertEvent = MagicMock()
-    # Test fuse perm attr without fusing vboot key.
-    mock_atft.provision_steps = ['FusePermAttr']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft._SendAlertEvent.reset_mock()
-    self.assertEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Test fuse perm attr when already fused.
-    mock_atft.provision_steps = ['FuseVbootKey', 'FusePermAttr', 'FusePermAttr']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft._SendAlertEvent.reset_mock()
-    self.assertEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Test LockAvb when vboot key is not fused.
-    mock_atft.provision_steps = ['LockAvb']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft._SendAlertEvent.reset_mock()
-    self.assertEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Test LockAvb when perm attr not fused.
-    mock_atft.provision_steps = ['FuseVbootKey', 'LockAvb']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft._SendAlertEvent.reset_mock()
-    self.assertEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Test provision when perm attr not fused.
-    mock_atft.provision_steps = [
-        'FuseVbootKey', 'LockAvb', 'ProvisionProduct']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft._SendAlertEvent.reset_mock()
-    self.assertEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # All the tests should succeed if TEST_MODE is set to True
-
-    # Test fuse perm attr without fusing vboot key.
-    mock_atft.test_mode = True
-    mock_atft.provision_steps = ['FusePermAttr']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_not_called()
-    self.assertNotEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Test fuse perm attr when already fused.
-    mock_atft.provision_steps = ['FuseVbootKey', 'FusePermAttr', 'FusePermAttr']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_not_called()
-    self.assertNotEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Test LockAvb when vboot key is not fused.
-    mock_atft.provision_steps = ['LockAvb']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_not_called()
-    self.assertNotEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Test LockAvb when perm attr not fused.
-    mock_atft.provision_steps = ['FuseVbootKey', 'LockAvb']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_not_called()
-    self.assertNotEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
-
-    # Test provision when perm attr not fused.
-    mock_atft.provision_steps = [
-        'FuseVbootKey', 'LockAvb', 'ProvisionProduct']
-    mock_atft._CheckProvisionSteps()
-    mock_atft._SendAlertEvent.assert_not_called()
-    self.assertNotEqual(
-        mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT, mock_atft.provision_steps)
+    mock_atft = self.shared_atft.Copy()
+    insecure_provision_steps = (
+        # Fuse perm attr without fusing vboot key.
+        ['FusePermAttr'],
+        # Fuse perm attr when already fused.
+        ['FuseVbootKey', 'FusePermAttr', 'FusePermAttr'],
+        # LockAvb when vboot key is not fused.
+        ['LockAvb'],
+        # LockAvb when perm attr not fused.
+        ['FuseVbootKey', 'LockAvb'],
+        # Provision when perm attr not fused.
+        ['FuseVbootKey', 'LockAvb', 'ProvisionProduct'])
+    # All the tests should succeed if TEST_MODE is set to True.
+    for test_mode in (False, True):
+      for provision_steps in insecure_provision_steps:
+        msg = '%r, test_mode: %s' % (provision_steps, test_mode)
+        mock_atft._SendAlertEvent = MagicMock()
+        mock_atft.test_mode = test_mode
+        mock_atft.provision_steps = provision_steps
+        mock_atft._CheckProvisionSteps()
+        if test_mode:
+          self.assertEqual(0, mock_atft._SendAlertEvent.call_count, msg=msg)
+          self.assertEqual(provision_steps, mock_atft.provision_steps, msg=msg)
+        else:
+          self.assertEqual(1, mock_atft._SendAlertEvent.call_count, msg=msg)
+          self.assertIs(
+              mock_atft.DEFAULT_PROVISION_STEPS_PRODUCT,
+              mock_atft.provision_steps, msg=msg)
 
   # Test AtftLog.Initialize()
-  def IncreaseMockTime(self, format):
-    self.mock_time += 1
-    return str(self.mock_time - 1)
-
   def CreateAuditFiles(self, filepath, file_type, show_alert, blocking):
     self.fs.create_file(filepath)
     return True
 
-  @patch('datetime.datetime')
-  def testAtftAudit(self, mock_datetime):
-    download_interval = 2
-    get_file_handler = MagicMock()
-    get_file_handler.side_effect = self.CreateAuditFiles
-    get_atfa_serial = MagicMock()
-    get_atfa_serial.return_value = self.TEST_SERIAL1
-    mock_time = MagicMock()
-    mock_datetime.utcnow.return_value = mock_time
-    mock_time.strftime.side_effect = self.IncreaseMockTime
-    handle_exception_handler = MagicMock()
-
-    audit_file_path_0 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_0.audit')
-    audit_file_path_1 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_1.audit')
-    audit_file_path_2 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_2.audit')
-    audit_file_path_3 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_3.audit')
+  def PatchAuditTime(self, start_time):
+    """Patch datetime.datetime until the test ends to number the audit files.
 
-    self.mock_time = 0
+    Each datetime.datetime.utcnow().strftime() call returns the next number,
+    starting from start_time.
 
-    test_audit = atft.AtftAudit(
-        self.AUDIT_DIR,
-        download_interval,
-        get_file_handler,
-        handle_exception_handler,
-        get_atfa_serial)
+    Args:
+      start_time: The number of the first audit file pulled.
+    """
+    audit_times = itertools.count(start_time)
+    patcher = patch('datetime.datetime')
+    mock_datetime = patcher.start()
+    self.addCleanup(patcher.stop)
+    mock_datetime.utcnow.return_value.strftime.side_effect = (
+        lambda format: str(next(audit_times)))
+
+  def CreateAudit(self, start_time, existing_files=0):
+    """Create an AtftAudit pulling the audit files of TEST_SERIAL1.
+
+    Its get_file_handler creates the pulled file and succeeds, and its
+    handle_exception_handler and get_atfa_serial are mocks. The audit time is
+    patched with PatchAuditTime.
+
+    Args:
+      start_time: The number of the first audit file pulled.
+      existing_files: How many TEST_SERIAL1 audit files, numbered from 0, are
+        already in AUDIT_DIR.
+    Returns:
+      The AtftAudit object.
+    """
+    self.PatchAuditTime(start_time)
+    for number in range(existing_files):
+      self.fs.create_file(self.audit_files[self.TEST_SERIAL1, number])
+    get_file_handler = MagicMock(side_effect=self.CreateAuditFiles)
+    get_atfa_serial = MagicMock(return_value=self.TEST_SERIAL1)
+    return atft.AtftAudit(
+        self.AUDIT_DIR, 2, get_file_handler, MagicMock(), get_atfa_serial)
+
+  def testAtftAudit(self):
+    test_audit = self.CreateAudit(0)
+    get_file_handler = test_audit.get_file_handler
+    audit_file_path_0 = self.audit_files[self.TEST_SERIAL1, 0]
+    audit_file_path_1 = self.audit_files[self.TEST_SERIAL1, 1]
+    audit_file_path_2 = self.audit_files[self.TEST_SERIAL1, 2]
+    audit_file_path_3 = self.audit_files[self.TEST_SERIAL1, 3]
 
     self.assertEqual(True, os.path.exists(self.AUDIT_DIR))
     test_audit.PullAudit(10)
@@ -2683,7 +2032,7 @@ class AtftTest(TestCase):
     self.assertEqual(True, os.path.isfile(audit_file_path_0))
 
     test_audit.PullAudit(9)
-    get_file_handler.assert_not_called()
+    self.assertEqual(0, get_file_handler.call_count)
     self.assertEqual(True, os.path.isfile(audit_file_path_0))
 
     test_audit.PullAudit(8)
@@ -2694,7 +2043,7 @@ class AtftTest(TestCase):
 
     get_file_handler.reset_mock()
     test_audit.PullAudit(7)
-    get_file_handler.assert_not_called()
+    self.assertEqual(0, get_file_handler.call_count)
     self.assertEqual(False, os.path.isfile(audit_file_path_0))
     self.assertEqual(True, os.path.isfile(audit_file_path_1))
 
@@ -2712,131 +2061,39 @@ class AtftTest(TestCase):
     self.assertEqual(False, os.path.isfile(audit_file_path_2))
     self.assertEqual(True, os.path.isfile(audit_file_path_3))
 
-    # Clear state
-    shutil.rmtree(self.AUDIT_DIR)
-
-  @patch('datetime.datetime')
-  def testAtftAuditRemoveMultipleFiles(self, mock_datetime):
+  def testAtftAuditRemoveMultipleFiles(self):
     # If more than one files for one ATFA left, must remove them all.
-    download_interval = 2
-    get_file_handler = MagicMock()
-    get_file_handler.side_effect = self.CreateAuditFiles
-    get_atfa_serial = MagicMock()
-    get_atfa_serial.return_value = self.TEST_SERIAL1
-    mock_time = MagicMock()
-    mock_datetime.utcnow.return_value = mock_time
-    mock_time.strftime.side_effect = self.IncreaseMockTime
-    handle_exception_handler = MagicMock()
-
-    audit_file_path_0 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_0.audit')
-    audit_file_path_1 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_1.audit')
-    audit_file_path_2 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_2.audit')
-    audit_file_path_3 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_3.audit')
-
-    mock_audit_files = [
-        self.TEST_SERIAL1 + '_0.audit',
-        self.TEST_SERIAL1 + '_1.audit',
-        self.TEST_SERIAL1 + '_2.audit']
-    self.mock_time = 3
-    for mock_audit_file in mock_audit_files:
-      self.fs.create_file(os.path.join(self.AUDIT_DIR, mock_audit_file))
-
-    test_audit = atft.AtftAudit(
-        self.AUDIT_DIR,
-        download_interval,
-        get_file_handler,
-        handle_exception_handler,
-        get_atfa_serial)
+    test_audit = self.CreateAudit(3, existing_files=3)
     test_audit.PullAudit(10)
-    get_file_handler.assert_called_once_with(
-        audit_file_path_3, 'audit', False, False)
-    self.assertEqual(False, os.path.isfile(audit_file_path_0))
-    self.assertEqual(False, os.path.isfile(audit_file_path_1))
-    self.assertEqual(False, os.path.isfile(audit_file_path_2))
-    self.assertEqual(True, os.path.isfile(audit_file_path_3))
-    # Clear state
-    shutil.rmtree(self.AUDIT_DIR)
-
-  @patch('datetime.datetime')
-  def testAtftAuditRemoveMultipleFilesFailure(self, mock_datetime):
-     # If get file fails, must not remove file.
-    download_interval = 2
-    get_file_handler = MagicMock()
-    # Get file handler fails.
-    get_file_handler.return_value = False
-    get_atfa_serial = MagicMock()
-    get_atfa_serial.return_value = self.TEST_SERIAL1
-    mock_time = MagicMock()
-    mock_datetime.utcnow.return_value = mock_time
-    mock_time.strftime.side_effect = self.IncreaseMockTime
-    handle_exception_handler = MagicMock()
-
-    audit_file_path_0 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_0.audit')
-    audit_file_path_1 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_1.audit')
-    audit_file_path_2 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_2.audit')
-    audit_file_path_3 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_3.audit')
-
-    mock_audit_files = [
-        self.TEST_SERIAL1 + '_0.audit',
-        self.TEST_SERIAL1 + '_1.audit',
-        self.TEST_SERIAL1 + '_2.audit']
-    self.mock_time = 3
-    for mock_audit_file in mock_audit_files:
-      self.fs.create_file(os.path.join(self.AUDIT_DIR, mock_audit_file))
-
-    test_audit = atft.AtftAudit(
-        self.AUDIT_DIR,
-        download_interval,
-        get_file_handler,
-        handle_exception_handler,
-        get_atfa_serial)
+    test_audit.get_file_handler.assert_called_once_with(
+        self.audit_files[self.TEST_SERIAL1, 3], 'audit', False, False)
+    for number, exists in ((0, False), (1, False), (2, False), (3, True)):
+      self.assertEqual(
+          exists, os.path.isfile(self.audit_files[self.TEST_SERIAL1, number]),
+          msg=number)
+
+  def testAtftAuditRemoveMultipleFilesFailure(self):
+    # If get file fails, must not remove file.
+    test_audit = self.CreateAudit(3, existing_files=3)
+    test_audit.get_file_handler.side_effect = None
+    test_audit.get_file_handler.return_value = False
     test_audit.PullAudit(10)
-    get_file_handler.assert_called_once_with(
-        audit_file_path_3, 'audit', False, False)
-    self.assertEqual(True, os.path.isfile(audit_file_path_0))
-    self.assertEqual(True, os.path.isfile(audit_file_path_1))
-    self.assertEqual(True, os.path.isfile(audit_file_path_2))
-    self.assertEqual(False, os.path.isfile(audit_file_path_3))
-    # Clear state
-    shutil.rmtree(self.AUDIT_DIR)
-
-  @patch('datetime.datetime')
-  def testAtftAuditMultipleATFAs(self, mock_datetime):
-    download_interval = 2
-    get_file_handler = MagicMock()
-    get_file_handler.side_effect = self.CreateAuditFiles
-    get_atfa_serial = MagicMock()
-    get_atfa_serial.return_value = self.TEST_SERIAL1
-    mock_time = MagicMock()
-    mock_datetime.utcnow.return_value = mock_time
-    mock_time.strftime.side_effect = self.IncreaseMockTime
-    handle_exception_handler = MagicMock()
+    test_audit.get_file_handler.assert_called_once_with(
+        self.audit_files[self.TEST_SERIAL1, 3], 'audit', False, False)
+    for number, exists in ((0, True), (1, True), (2, True), (3, False)):
+      self.assertEqual(
+          exists, os.path.isfile(self.audit_files[self.TEST_SERIAL1, number]),
+          msg=number)
+
+  def testAtftAuditMultipleATFAs(self):
+    test_audit = self.CreateAudit(0)
+    get_file_handler = test_audit.get_file_handler
+    get_atfa_serial = test_audit.get_atfa_serial
+    audit_file_path_1_0 = self.audit_files[self.TEST_SERIAL1, 0]
+    audit_file_path_2_1 = self.audit_files[self.TEST_SERIAL2, 1]
+    audit_file_path_1_2 = self.audit_files[self.TEST_SERIAL1, 2]
+    audit_file_path_2_3 = self.audit_files[self.TEST_SERIAL2, 3]
 
-    audit_file_path_1_0 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_0.audit')
-    audit_file_path_2_1 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL2 + '_1.audit')
-    audit_file_path_1_2 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL1 + '_2.audit')
-    audit_file_path_2_3 = os.path.join(
-        self.AUDIT_DIR, self.TEST_SERIAL2 + '_3.audit')
-
-    self.mock_time = 0
-
-    test_audit = atft.AtftAudit(
-        self.AUDIT_DIR,
-        download_interval,
-        get_file_handler,
-        handle_exception_handler,
-        get_atfa_serial)
     test_audit.PullAudit(10)
     get_file_handler.assert_called_once_with(
         audit_file_path_1_0, 'audit', False, False)
@@ -2875,42 +2132,17 @@ class AtftTest(TestCase):
     self.assertEqual(True, os.path.isfile(audit_file_path_1_2))
     self.assertEqual(False, os.path.isfile(audit_file_path_2_1))
     self.assertEqual(True, os.path.isfile(audit_file_path_2_3))
-    # Clear state
-    shutil.rmtree(self.AUDIT_DIR)
-
-  @patch('datetime.datetime')
-  def testAtftAuditFastbootFailure(self, mock_datetime):
-    download_interval = 2
-    get_file_handler = MagicMock()
-    get_file_handler.side_effect = self.CreateAuditFiles
-    get_atfa_serial = MagicMock()
-    get_atfa_serial.side_effect = fastboot_exceptions.FastbootFailure('')
-    mock_time = MagicMock()
-    mock_datetime.utcnow.return_value = mock_time
-    mock_time.strftime.side_effect = self.IncreaseMockTime
-    handle_exception_handler = MagicMock()
 
-    self.mock_time = 0
-
-    test_audit = atft.AtftAudit(
-        self.AUDIT_DIR,
-        download_interval,
-        get_file_handler,
-        handle_exception_handler,
-        get_atfa_serial)
+  def testAtftAuditFastbootFailure(self):
+    test_audit = self.CreateAudit(0)
+    test_audit.get_atfa_serial.side_effect = FASTBOOT_FAILURE
     test_audit.PullAudit(10)
-    get_file_handler.assert_not_called()
-    handle_exception_handler.assert_called_once()
-
-    # Clear state
-    shutil.rmtree(self.AUDIT_DIR)
+    self.assertEqual(0, test_audit.get_file_handler.call_count)
+    self.assertEqual(1, test_audit.handle_exception_handler.call_count)
 
   def testManualMapUSBLocationToSlot(self):
-    mock_atft = MockAtft()
-    mock_atft.device_usb_locations = []
-    for i in range(mock_atft.TARGET_DEV_SIZE):
-      mock_atft.device_usb_locations.append(None)
-    mock_atft.atft_manager = MagicMock()
+    mock_atft = self.shared_atft.Copy()
+    mock_atft.device_usb_locations = list(self.EMPTY_USB_LOCATIONS)
     mock_atft.SendUpdateMappingEvent = MagicMock()
     mock_atft._SendAlertEvent = MagicMock()
     mock_atft.ShowWarning = MagicMock()
@@ -2929,9 +2161,9 @@ class AtftTest(TestCase):
     mock_atft.app_settings_dialog.dev_mapping_components = [mock_dev_components]
     mock_atft.atft_manager.target_devs = [mock_device_1]
     mock_atft.ManualMapUSBLocationToSlot(MagicMock())
-    mock_atft.ShowWarning.assert_not_called()
-    mock_atft._SendAlertEvent.assert_not_called()
-    mock_atft.SendUpdateMappingEvent.assert_called_once()
+    self.assertEqual(0, mock_atft.ShowWarning.call_count)
+    self.assertEqual(0, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(1, mock_atft.SendUpdateMappingEvent.call_count)
     for i in range(mock_atft.TARGET_DEV_SIZE):
       if i == 0:
         self.assertEqual(self.TEST_LOCATION1, mock_atft.device_usb_locations[i])
@@ -2943,9 +2175,9 @@ class AtftTest(TestCase):
     mock_dev_components.index = 1
     mock_atft.atft_manager.target_devs = [mock_device_2]
     mock_atft.ManualMapUSBLocationToSlot(MagicMock())
-    mock_atft.ShowWarning.assert_not_called()
-    mock_atft._SendAlertEvent.assert_not_called()
-    mock_atft.SendUpdateMappingEvent.assert_called_once()
+    self.assertEqual(0, mock_atft.ShowWarning.call_count)
+    self.assertEqual(0, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(1, mock_atft.SendUpdateMappingEvent.call_count)
     for i in range(mock_atft.TARGET_DEV_SIZE):
       if i == 0:
         self.assertEqual(self.TEST_LOCATION1, mock_atft.device_usb_locations[i])
@@ -2962,9 +2194,9 @@ class AtftTest(TestCase):
     mock_atft.atft_manager.target_devs = [mock_device_3]
     mock_atft.ManualMapUSBLocationToSlot(MagicMock())
     # Show a warning for remapping.
-    mock_atft.ShowWarning.assert_called_once()
-    mock_atft._SendAlertEvent.assert_not_called()
-    mock_atft.SendUpdateMappingEvent.assert_called_once()
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
+    self.assertEqual(0, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(1, mock_atft.SendUpdateMappingEvent.call_count)
     for i in range(mock_atft.TARGET_DEV_SIZE):
       if i == 0:
         self.assertEqual(self.TEST_LOCATION3, mock_atft.device_usb_locations[i])
@@ -2981,9 +2213,9 @@ class AtftTest(TestCase):
     mock_atft.atft_manager.target_devs = [mock_device_1]
     mock_atft.ManualMapUSBLocationToSlot(MagicMock())
     # Show a warning for remapping.
-    mock_atft.ShowWarning.assert_called_once()
-    mock_atft._SendAlertEvent.assert_not_called()
-    mock_atft.SendUpdateMappingEvent.assert_not_called()
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
+    self.assertEqual(0, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(0, mock_atft.SendUpdateMappingEvent.call_count)
     for i in range(mock_atft.TARGET_DEV_SIZE):
       if i == 0:
         self.assertEqual(self.TEST_LOCATION3, mock_atft.device_usb_locations[i])
@@ -3001,9 +2233,9 @@ class AtftTest(TestCase):
     mock_atft.atft_manager.target_devs = [mock_device_3]
     mock_atft.ManualMapUSBLocationToSlot(MagicMock())
     # Show a warning for remapping.
-    mock_atft.ShowWarning.assert_called_once()
-    mock_atft._SendAlertEvent.assert_not_called()
-    mock_atft.SendUpdateMappingEvent.assert_called_once()
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
+    self.assertEqual(0, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(1, mock_atft.SendUpdateMappingEvent.call_count)
     for i in range(mock_atft.TARGET_DEV_SIZE):
       if i == 1:
         self.assertEqual(self.TEST_LOCATION2, mock_atft.device_usb_locations[i])
@@ -3017,8 +2249,8 @@ class AtftTest(TestCase):
     mock_dev_components.index = 2
     mock_atft.atft_manager.target_devs = []
     mock_atft.ManualMapUSBLocationToSlot(MagicMock())
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft.SendUpdateMappingEvent.assert_not_called()
+    self.assertEqual(1, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(0, mock_atft.SendUpdateMappingEvent.call_count)
 
     # More than one target devices, gives alert.
     mock_atft.SendUpdateMappingEvent.reset_mock()
@@ -3026,16 +2258,13 @@ class AtftTest(TestCase):
     mock_dev_components.index = 2
     mock_atft.atft_manager.target_devs = [mock_device_1, mock_device_2]
     mock_atft.ManualMapUSBLocationToSlot(MagicMock())
-    mock_atft._SendAlertEvent.assert_called_once()
-    mock_atft.SendUpdateMappingEvent.assert_not_called()
+    self.assertEqual(1, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(0, mock_atft.SendUpdateMappingEvent.call_count)
 
   def testUnmapUSBLocationToSlot(self):
     # Test atft.UnmapUSBLocationToSlot
-    mock_atft = MockAtft()
-    mock_atft.device_usb_locations = []
-    for i in range(mock_atft.TARGET_DEV_SIZE):
-      mock_atft.device_usb_locations.append(None)
-    mock_atft.atft_manager = MagicMock()
+    mock_atft = self.shared_atft.Copy()
+    mock_atft.device_usb_locations = list(self.EMPTY_USB_LOCATIONS)
     mock_atft.SendUpdateMappingEvent = MagicMock()
     mock_atft._SendAlertEvent = MagicMock()
     mock_atft.ShowWarning = MagicMock()
@@ -3049,7 +2278,7 @@ class AtftTest(TestCase):
     mock_atft.app_settings_dialog.dev_mapping_components = []
     mock_atft.UnmapUSBLocationToSlot(MagicMock())
     # Should send an alert.
-    mock_atft._SendAlertEvent.assert_called_once()
+    self.assertEqual(1, mock_atft._SendAlertEvent.call_count)
     mock_atft._SendAlertEvent.reset_mock()
 
     # Test the slot selected is not mapped, so do nothing.
@@ -3058,8 +2287,8 @@ class AtftTest(TestCase):
     mock_dev_components.index = 0
     mock_atft.app_settings_dialog.dev_mapping_components = [mock_dev_components]
     mock_atft.UnmapUSBLocationToSlot(MagicMock())
-    mock_atft._SendAlertEvent.assert_not_called()
-    mock_atft.ShowWarning.assert_not_called()
+    self.assertEqual(0, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(0, mock_atft.ShowWarning.call_count)
 
     # Normal case: the slot selected is mapped, unmap it.
     mock_atft.device_usb_locations[0] = self.TEST_LOCATION1
@@ -3068,8 +2297,8 @@ class AtftTest(TestCase):
     # User click yes.
     mock_atft.ShowWarning.return_value = True
     mock_atft.UnmapUSBLocationToSlot(MagicMock())
-    mock_atft._SendAlertEvent.assert_not_called()
-    mock_atft.ShowWarning.assert_called_once()
+    self.assertEqual(0, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
     mock_atft.ShowWarning.reset_mock()
     self.assertEqual(None, mock_atft.device_usb_locations[0])
     self.assertEqual(self.TEST_LOCATION2, mock_atft.device_usb_locations[1])
@@ -3080,14 +2309,13 @@ class AtftTest(TestCase):
     mock_atft.app_settings_dialog.dev_mapping_components = [mock_dev_components]
     mock_atft.ShowWarning.return_value = False
     mock_atft.UnmapUSBLocationToSlot(MagicMock())
-    mock_atft._SendAlertEvent.assert_not_called()
-    mock_atft.ShowWarning.assert_called_once()
+    self.assertEqual(0, mock_atft._SendAlertEvent.call_count)
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
     mock_atft.ShowWarning.reset_mock()
     self.assertEqual(self.TEST_LOCATION1, mock_atft.device_usb_locations[0])
     self.assertEqual(self.TEST_LOCATION2, mock_atft.device_usb_locations[1])
 
-  @patch('threading.Timer')
-  def testProcessKeyFileAutomatically(self, mock_create_timer):
+  def testProcessKeyFileAutomatically(self):
     # Test automatically processing unprocessed key bundle files from KEY_DIR.
     self.fs.create_dir(self.LOG_DIR)
     self.fs.create_dir(self.KEY_DIR)
@@ -3111,7 +2339,7 @@ class AtftTest(TestCase):
     atft_key_handler.StartProcessKey()
     process_key_handler.assert_called_once_with(
         os.path.join(self.KEY_DIR, key1), True)
-    mock_create_timer.assert_called_once()
+    self.assertEqual(1, self.mock_timer.call_count)
     self.assertEqual(
         True, self.TEST_ATFA_ID1 in atft_key_handler.processed_keys)
     self.assertEqual(
@@ -3123,7 +2351,7 @@ class AtftTest(TestCase):
     get_atfa_serial.return_value = self.TEST_ATFA_ID2
     process_key_handler.reset_mock()
     atft_key_handler.ProcessKeyFile()
-    process_key_handler.assert_not_called()
+    self.assertEqual(0, process_key_handler.call_count)
 
     # If the error is DeviceNotFound, than don't record it to processed keys.
     get_atfa_serial.return_value = self.TEST_ATFA_ID2
@@ -3132,33 +2360,32 @@ class AtftTest(TestCase):
     process_key_handler.side_effect = (
         fastboot_exceptions.DeviceNotFoundException)
     atft_key_handler.ProcessKeyFile()
-    process_key_handler.assert_called_once()
+    self.assertEqual(1, process_key_handler.call_count)
     self.assertEqual(
         False, self.TEST_ATFA_ID2 in atft_key_handler.processed_keys)
 
     # If the error is FastbootFailure, do not add it to processed keys.
     process_key_handler.reset_mock()
-    process_key_handler.side_effect = (
-        fastboot_exceptions.FastbootFailure(''))
+    process_key_handler.side_effect = FASTBOOT_FAILURE
     atft_key_handler.ProcessKeyFile()
-    process_key_handler.assert_called_once()
+    self.assertEqual(1, process_key_handler.call_count)
     self.assertEqual(
         False, self.TEST_ATFA_ID2 in atft_key_handler.processed_keys)
-    handle_exception_handler.assert_called_once()
+    self.assertEqual(1, handle_exception_handler.call_count)
 
      # No error happens, add key2 to processed keys for ATFA_ID2
     process_key_handler.side_effect = None
     process_key_handler.reset_mock()
     handle_exception_handler.reset_mock()
     atft_key_handler.ProcessKeyFile()
-    process_key_handler.assert_called_once()
+    self.assertEqual(1, process_key_handler.call_count)
     self.assertEqual(
         True, self.TEST_ATFA_ID2 in atft_key_handler.processed_keys)
     self.assertEqual(
         1, len(atft_key_handler.processed_keys[self.TEST_ATFA_ID2]))
     self.assertEqual(
         True, key2 in atft_key_handler.processed_keys[self.TEST_ATFA_ID2])
-    handle_exception_handler.assert_not_called()
+    self.assertEqual(0, handle_exception_handler.call_count)
 
     # If another key is added to the folder, process it.
     self.fs.create_file(os.path.join(self.KEY_DIR, key3))
@@ -3166,7 +2393,7 @@ class AtftTest(TestCase):
     process_key_handler.reset_mock()
     handle_exception_handler.reset_mock()
     atft_key_handler.ProcessKeyFile()
-    process_key_handler.assert_called_once()
+    self.assertEqual(1, process_key_handler.call_count)
     self.assertEqual(
         True, self.TEST_ATFA_ID2 in atft_key_handler.processed_keys)
     self.assertEqual(
@@ -3175,15 +2402,15 @@ class AtftTest(TestCase):
         True, key2 in atft_key_handler.processed_keys[self.TEST_ATFA_ID2])
     self.assertEqual(
         True, key3 in atft_key_handler.processed_keys[self.TEST_ATFA_ID2])
-    handle_exception_handler.assert_not_called()
+    self.assertEqual(0, handle_exception_handler.call_count)
 
     # Assume the user opens the tool again, processed status should be recovered
     # from the log.
     handle_exception_handler.reset_mock()
     process_key_handler.reset_mock()
     atft_key_handler.StartProcessKey()
-    process_key_handler.assert_not_called()
-    handle_exception_handler.assert_not_called()
+    self.assertEqual(0, process_key_handler.call_count)
+    self.assertEqual(0, handle_exception_handler.call_count)
     self.assertEqual(
         True, self.TEST_ATFA_ID1 in atft_key_handler.processed_keys)
     self.assertEqual(
@@ -3203,8 +2430,7 @@ class AtftTest(TestCase):
     shutil.rmtree(self.KEY_DIR)
     shutil.rmtree(self.LOG_DIR)
 
-  @patch('threading.Timer')
-  def testProcessKeyFileAutoProcessed(self, mock_create_timer):
+  def testProcessKeyFileAutoProcessed(self):
     # Test marking keys as processed if the the ATFA returns a key processed
     # error.
     self.fs.create_dir(self.LOG_DIR)
@@ -3229,7 +2455,7 @@ class AtftTest(TestCase):
     atft_key_handler.StartProcessKey()
     process_key_handler.assert_called_once_with(
         os.path.join(self.KEY_DIR, key1), True)
-    mock_create_timer.assert_called_once()
+    self.assertEqual(1, self.mock_timer.call_count)
     self.assertEqual(
         True, self.TEST_ATFA_ID1 in atft_key_handler.processed_keys)
     self.assertEqual(
@@ -3243,9 +2469,8 @@ class AtftTest(TestCase):
 
   def testGetAvailableDevicesSingleDeviceMode(self):
     # Test Atft._GetAvailableDevices in single device mode.
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft.mapping_mode = mock_atft.SINGLE_DEVICE_MODE
-    mock_atft.atft_manager = MagicMock()
     test_dev1 = self.test_dev1
     test_dev2 = self.test_dev2
     mock_atft.atft_manager.target_devs = [test_dev2]
@@ -3316,9 +2541,8 @@ class AtftTest(TestCase):
 
   def testGetAvailableDevicesMultipleDeviceMode(self):
     # Test Atft._GetAvailableDevices in multiple device mode.
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft.mapping_mode = mock_atft.MULTIPLE_DEVICE_MODE
-    mock_atft.atft_manager = MagicMock()
     test_dev1 = TestDeviceInfo(
         self.TEST_SERIAL1, self.TEST_LOCATION1, ProvisionStatus.IDLE)
     test_dev2 = TestDeviceInfo(
@@ -3371,7 +2595,7 @@ class AtftTest(TestCase):
 
   def testCheckMappingMode(self):
     # Test Atft._CheckMappingMode.
-    mock_atft = MockAtft()
+    mock_atft = self.shared_atft.Copy()
     mock_atft.ChangeSettings = MagicMock()
     mock_atft.app_settings_dialog = MagicMock()
     mock_atft.app_settings_dialog.ShowUSBMappingSetting = MagicMock()
@@ -3382,81 +2606,90 @@ class AtftTest(TestCase):
 
     # Only one target device in single device mode, do nothing.
     mock_atft.mapping_mode = mock_atft.SINGLE_DEVICE_MODE
-    mock_atft.atft_manager = MagicMock()
     mock_atft.atft_manager.target_devs = [self.test_dev1]
     mock_atft._CheckMappingMode()
-    mock_atft.change_mapping_mode_dialog.ShowModal.assert_not_called()
-    mock_atft.ChangeSettings.assert_not_called()
-    mock_atft.app_settings_dialog.ShowUSBMappingSetting.assert_not_called()
-    mock_atft.ShowWarning.assert_not_called()
+    self.assertEqual(
+        0, mock_atft.change_mapping_mode_dialog.ShowModal.call_count)
+    self.assertEqual(0, mock_atft.ChangeSettings.call_count)
+    self.assertEqual(
+        0, mock_atft.app_settings_dialog.ShowUSBMappingSetting.call_count)
+    self.assertEqual(0, mock_atft.ShowWarning.call_count)
 
     # Two target devices in single device mode, user choose mapping.
     mock_atft.mapping_mode = mock_atft.SINGLE_DEVICE_MODE
-    mock_atft.atft_manager = MagicMock()
     mock_atft.atft_manager.target_devs = [self.test_dev1, self.test_dev2]
     mock_atft.change_mapping_mode_dialog.ShowModal.return_value = wx.ID_YES
     mock_atft._CheckMappingMode()
-    mock_atft.change_mapping_mode_dialog.ShowModal.assert_called_once()
+    self.assertEqual(
+        1, mock_atft.change_mapping_mode_dialog.ShowModal.call_count)
     mock_atft.change_mapping_mode_dialog.ShowModal.reset_mock()
-    mock_atft.ChangeSettings.assert_called_once()
+    self.assertEqual(1, mock_atft.ChangeSettings.call_count)
     mock_atft.ChangeSettings.reset_mock()
-    mock_atft.app_settings_dialog.ShowUSBMappingSetting.assert_called_once()
+    self.assertEqual(
+        1, mock_atft.app_settings_dialog.ShowUSBMappingSetting.call_count)
     mock_atft.app_settings_dialog.ShowUSBMappingSetting.reset_mock()
-    mock_atft.ShowWarning.assert_not_called()
+    self.assertEqual(0, mock_atft.ShowWarning.call_count)
 
     # All target devices already mapped in multiple device mode, do nothing.
     mock_atft.mapping_mode = mock_atft.MULTIPLE_DEVICE_MODE
-    mock_atft.atft_manager = MagicMock()
     mock_atft.atft_manager.target_devs = [self.test_dev1]
     mock_atft.device_usb_locations = [self.TEST_LOCATION1]
     mock_atft._CheckMappingMode()
-    mock_atft.change_mapping_mode_dialog.ShowModal.assert_not_called()
-    mock_atft.ChangeSettings.assert_not_called()
-    mock_atft.app_settings_dialog.ShowUSBMappingSetting.assert_not_called()
-    mock_atft.ShowWarning.assert_not_called()
+    self.assertEqual(
+        0, mock_atft.change_mapping_mode_dialog.ShowModal.call_count)
+    self.assertEqual(0, mock_atft.ChangeSettings.call_count)
+    self.assertEqual(
+        0, mock_atft.app_settings_dialog.ShowUSBMappingSetting.call_count)
+    self.assertEqual(0, mock_atft.ShowWarning.call_count)
 
     # One target device not mapped, show warning, user click yes.
     mock_atft.mapping_mode = mock_atft.MULTIPLE_DEVICE_MODE
-    mock_atft.atft_manager = MagicMock()
     mock_atft.atft_manager.target_devs = [self.test_dev1, self.test_dev2]
     mock_atft.device_usb_locations = [self.TEST_LOCATION1]
     mock_atft.ShowWarning.return_value = True
     mock_atft._CheckMappingMode()
-    mock_atft.change_mapping_mode_dialog.ShowModal.assert_not_called()
-    mock_atft.ChangeSettings.assert_called_once()
+    self.assertEqual(
+        0, mock_atft.change_mapping_mode_dialog.ShowModal.call_count)
+    self.assertEqual(1, mock_atft.ChangeSettings.call_count)
     mock_atft.ChangeSettings.reset_mock()
-    mock_atft.app_settings_dialog.ShowUSBMappingSetting.assert_called_once()
+    self.assertEqual(
+        1, mock_atft.app_settings_dialog.ShowUSBMappingSetting.call_count)
     mock_atft.app_settings_dialog.ShowUSBMappingSetting.reset_mock()
-    mock_atft.ShowWarning.assert_called_once()
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
     mock_atft.ShowWarning.reset_mock()
 
     # Make sure this device is ignored the second time.
     mock_atft._CheckMappingMode()
-    mock_atft.change_mapping_mode_dialog.ShowModal.assert_not_called()
-    mock_atft.ChangeSettings.assert_not_called()
-    mock_atft.app_settings_dialog.ShowUSBMappingSetting.assert_not_called()
-    mock_atft.ShowWarning.assert_not_called()
+    self.assertEqual(
+        0, mock_atft.change_mapping_mode_dialog.ShowModal.call_count)
+    self.assertEqual(0, mock_atft.ChangeSettings.call_count)
+    self.assertEqual(
+        0, mock_atft.app_settings_dialog.ShowUSBMappingSetting.call_count)
+    self.assertEqual(0, mock_atft.ShowWarning.call_count)
 
     # One target device not mapped, show warning, user click no.
     mock_atft.ignored_unmapped_device_serials = sets.Set()
     mock_atft.mapping_mode = mock_atft.MULTIPLE_DEVICE_MODE
-    mock_atft.atft_manager = MagicMock()
     mock_atft.atft_manager.target_devs = [self.test_dev1, self.test_dev2]
     mock_atft.device_usb_locations = [self.TEST_LOCATION1]
     mock_atft.ShowWarning.return_value = False
     mock_atft._CheckMappingMode()
-    mock_atft.change_mapping_mode_dialog.ShowModal.assert_not_called()
-    mock_atft.ChangeSettings.assert_not_called()
-    mock_atft.app_settings_dialog.ShowUSBMappingSetting.assert_not_called()
-    mock_atft.ShowWarning.assert_called_once()
+    self.assertEqual(
+        0, mock_atft.change_mapping_mode_dialog.ShowModal.call_count)
+    self.assertEqual(0, mock_atft.ChangeSettings.call_count)
+    self.assertEqual(
+        0, mock_atft.app_settings_dialog.ShowUSBMappingSetting.call_count)
+    self.assertEqual(1, mock_atft.ShowWarning.call_count)
     mock_atft.ShowWarning.reset_mock()
 
     # Make sure this device is ignored the second time.
     mock_atft._CheckMappingMode()
-    mock_atft.change_mapping_mode_dialog.ShowModal.assert_not_called()
-    mock_atft.ChangeSettings.assert_not_called()
-    mock_atft.app_settings_dialog.ShowUSBMappingSetting.assert_not_called()
-    mock_atft.ShowWarning.assert_not_called()
+    self.assertEqual(
+        0, mock_atft.change_mapping_mode_dialog.ShowModal.call_count)
+    self.assertEqual(0, mock_atft.ChangeSettings.call_count)
+    self.assertEqual(
+        0, mock_atft.app_settings_dialog.ShowUSBMappingSetting.call_count)
+    self.assertEqual(0, mock_atft.ShowWarning.call_count)
 
 
 if __name__ == '__main__':